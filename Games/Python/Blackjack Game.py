@@ -2,6 +2,7 @@ import random
 import time
 from colorama import init, Fore, Style, Back
 import sys
+import signal
 import seaborn as sns
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -11,6 +12,8 @@ from matplotlib.ticker import MaxNLocator
 
 init(autoreset=True)
 
+MAX_SPLIT_HANDS = 4
+
 SUIT_SYMBOLS = {
     'Hearts':   Fore.RED + '♥' + Style.RESET_ALL,
     'Diamonds': Fore.RED + '♦' + Style.RESET_ALL,
@@ -125,60 +128,108 @@ class Deck:
     def needs_reshuffle(self):
         return len(self.deck) < (self.num_decks * 52 * 0.2) or len(self.deck) < 20
 
+def split_value(card):
+    if card.rank in ['Jack', 'Queen', 'King']:
+        return 10
+    elif card.rank == 'Ace':
+        return 11
+    else:
+        return int(card.rank)
+
+class Hand:
+    __slots__ = ('cards', 'bet', 'hard_total', 'aces', 'doubled', 'split')
+
+    def __init__(self, bet=0, split=False):
+        self.cards = []
+        self.bet = bet
+        self.hard_total = 0
+        self.aces = 0
+        self.doubled = False
+        self.split = split
+
+    def add_card(self, card):
+        self.cards.append(card)
+        self.hard_total += card.value
+        if card.rank == 'Ace':
+            self.aces += 1
+
+    @property
+    def score(self):
+        if self.aces and self.hard_total + 10 <= 21:
+            return self.hard_total + 10
+        return self.hard_total
+
+    def is_blackjack(self):
+        return len(self.cards) == 2 and not self.split and self.score == 21
+
+    def is_busted(self):
+        return self.hard_total > 21
+
+    def can_split(self):
+        return len(self.cards) == 2 and split_value(self.cards[0]) == split_value(self.cards[1])
+
+    def can_double(self):
+        return len(self.cards) == 2 and not self.doubled
+
+    def split_off(self):
+        card = self.cards.pop()
+        self.hard_total -= card.value
+        if card.rank == 'Ace':
+            self.aces -= 1
+        self.split = True
+        new_hand = Hand(self.bet, split=True)
+        new_hand.add_card(card)
+        return new_hand
+
 class Participant:
     def __init__(self, name):
         self.name = name
-        self.cards = []
+        self.hand = Hand()
         self.wins = 0
         self.losses = 0
         self.ties = 0
         self.blackjacks = 0
 
+    @property
+    def cards(self):
+        return self.hand.cards
+
     def receive_card(self, card):
-        self.cards.append(card)
+        self.hand.add_card(card)
 
     def clear_hand(self):
-        self.cards = []
+        self.hand = Hand()
 
     def compute_score(self):
-        total = 0
-        aces = 0
-
-        for c in self.cards:
-            if c.rank == 'Ace':
-                aces += 1
-            else:
-                total += c.value
-
-        total += aces
-
-        for _ in range(aces):
-            if total + 10 <= 21:
-                total += 10
-                break
-
-        return total
+        return self.hand.score
 
     def is_blackjack(self):
-        if len(self.cards) == 2:
-            ranks = [c.rank for c in self.cards]
-            if 'Ace' in ranks and any(r in ['10', 'Jack', 'Queen', 'King'] for r in ranks):
-                return True
-        return False
+        return self.hand.is_blackjack()
 
     def is_busted(self):
-        return self.compute_score() > 21
+        return self.hand.is_busted()
 
 class Player(Participant):
     def __init__(self, name):
         super().__init__(name)
-        self.split_hands = []
+        self.hands = [self.hand]
         self.current_streak = 0
         self.best_streak = 0
         self.worst_streak = 0
         self.total_bets = 0
         self.total_winnings = 0
 
+    def clear_hand(self, bet=0):
+        self.hand = Hand(bet)
+        self.hands = [self.hand]
+
+    def activate(self, index):
+        self.hand = self.hands[index]
+
+    def split_hand(self):
+        index = self.hands.index(self.hand)
+        self.hands.insert(index + 1, self.hand.split_off())
+
     def add_win(self, amount=0):
         self.wins += 1
         self.current_streak = max(1, self.current_streak + 1)
@@ -206,41 +257,110 @@ class GameStats:
     def __init__(self):
         self.rounds_played = 0
         self.hands_played = 0
+        self.winning_hands = 0
         self.capital_history = []
         self.win_rate_history = []
         self.outcome_history = []
         self.bet_sizes = []
         
     def add_round(self, outcome, capital, bet):
-        self.rounds_played += 1
-        self.hands_played += 1
-        self.capital_history.append(capital)
-        self.outcome_history.append(outcome)
-        self.bet_sizes.append(bet)
-        
-        if len(self.outcome_history) > 0:
-            wins = self.outcome_history.count("Win") + self.outcome_history.count("Blackjack")
-            win_rate = wins / len(self.outcome_history) * 100
-            self.win_rate_history.append(win_rate)
-        else:
-            self.win_rate_history.append(0)
+        self.add_hands([(outcome, bet)], capital)
     
-    def add_split_round(self, outcome1, outcome2, capital, bet):
+    def add_hands(self, results, capital):
         self.rounds_played += 1
-        self.hands_played += 2
+        for outcome, bet in results:
+            self.hands_played += 1
+            self.outcome_history.append(outcome)
+            self.bet_sizes.append(bet)
+            if outcome in ("Win", "Blackjack"):
+                self.winning_hands += 1
         self.capital_history.append(capital)
-        self.outcome_history.append(outcome1)
-        self.outcome_history.append(outcome2)
-        self.bet_sizes.append(bet)
-        self.bet_sizes.append(bet)
-        
-        if len(self.outcome_history) > 0:
-            wins = self.outcome_history.count("Win") + self.outcome_history.count("Blackjack")
-            win_rate = wins / len(self.outcome_history) * 100
-            self.win_rate_history.append(win_rate)
+        
+        if self.hands_played > 0:
+            self.win_rate_history.append(self.winning_hands / self.hands_played * 100)
         else:
             self.win_rate_history.append(0)
 
+class LatencyHistogram:
+    def __init__(self, significant_bits=5):
+        self.significant_bits = significant_bits
+        self.buckets = {}
+        self.count = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        # the max keeps the raw sample; only the bucket counts are quantized
+        if ns > self.max_ns:
+            self.max_ns = ns
+        shift = ns.bit_length() - self.significant_bits
+        if shift > 0:
+            ns = (ns >> shift) << shift
+        self.buckets[ns] = self.buckets.get(ns, 0) + 1
+        self.count += 1
+
+    def percentile(self, p):
+        if self.count == 0:
+            return 0
+        rank = max(1, int(round(p / 100 * self.count)))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return bucket
+        return self.max_ns
+
+class _TimedPhase:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+        return False
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_PHASE = _NullPhase()
+
+class PhaseProfiler:
+    PHASES = ['shuffle', 'deal', 'decision', 'dealer', 'result', 'dashboard']
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {name: LatencyHistogram() for name in self.PHASES}
+        self._phases = {name: _TimedPhase(hist) for name, hist in self.histograms.items()}
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return self._phases[name]
+
+    def install_signal_handler(self):
+        # SIGUSR1 only exists on POSIX; elsewhere the report is printed at session end only
+        if self.enabled and hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.report())
+
+    def report(self):
+        print("\n" + Fore.CYAN + "--- PHASE LATENCY (ms) ---" + Style.RESET_ALL)
+        print(f"{'Phase':<12}{'Count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'Max':>10}")
+        for name in self.PHASES:
+            hist = self.histograms[name]
+            p50, p95, p99 = (hist.percentile(p) / 1e6 for p in (50, 95, 99))
+            print(f"{name:<12}{hist.count:>8}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{hist.max_ns / 1e6:>10.2f}")
+
 class BlackjackDashboard:
     def __init__(self, stats, player, dealer, deck):
         self.stats = stats
@@ -492,8 +612,11 @@ class BlackjackDashboard:
         self.bet_ax.set_title("Bet Distribution", fontsize=12, fontweight='bold')
 
 class BlackjackGame:
-    def __init__(self, initial_capital):
-        self.deck_obj = Deck(num_decks=6)
+    def __init__(self, initial_capital, profile=False):
+        self.profiler = PhaseProfiler(enabled=profile)
+        self.profiler.install_signal_handler()
+        with self.profiler.phase('shuffle'):
+            self.deck_obj = Deck(num_decks=6)
         self.capital = initial_capital
         self.player = Player("Player")
         self.dealer = Dealer("Dealer")
@@ -512,6 +635,11 @@ class BlackjackGame:
         self.round_number = 0
         self.results_log = []
 
+    def refresh_dashboard(self):
+        if self.dashboard_enabled:
+            with self.profiler.phase('dashboard'):
+                self.dashboard.update_dashboard()
+
     def deal_card_animated(self, recipient):
         card_symbols = ['🂠', '🂡', '🂢', '🂣', '🂤']
         for symbol in card_symbols:
@@ -525,37 +653,28 @@ class BlackjackGame:
         recipient.receive_card(card)
         time.sleep(0.2)
 
-    def deal_initial_cards(self):
-        self.player.clear_hand()
+    def deal_initial_cards(self, bet):
+        self.player.clear_hand(bet)
         self.dealer.clear_hand()
 
         print(Fore.CYAN + "\nDealing initial cards..." + Style.RESET_ALL)
         
-        self.deal_card_animated(self.player)
-        self.deal_card_animated(self.dealer)
-        self.deal_card_animated(self.player)
-        self.deal_card_animated(self.dealer)
-
-    def can_split(self, cards):
-        if len(cards) == 2:
-            def card_basic_value(card):
-                if card.rank in ['Jack','Queen','King']:
-                    return 10
-                elif card.rank == 'Ace':
-                    return 11
-                else:
-                    return int(card.rank)
-            return card_basic_value(cards[0]) == card_basic_value(cards[1])
-        return False
+        with self.profiler.phase('deal'):
+            self.deal_card_animated(self.player)
+            self.deal_card_animated(self.dealer)
+            self.deal_card_animated(self.player)
+            self.deal_card_animated(self.dealer)
 
-    def display_game_screen(self, bet, hide_dealer=True):
+    def display_game_screen(self, hide_dealer=True):
         clear_screen()
         
+        total_bet = sum(hand.bet for hand in self.player.hands)
+        
         print(Fore.MAGENTA + "╔══════════════════════════════════════════════════╗" + Style.RESET_ALL)
         print(Fore.MAGENTA + "║            🎮  MARIO'S BLACKJACK  🎮              ║" + Style.RESET_ALL)
         print(Fore.MAGENTA + "╚══════════════════════════════════════════════════╝" + Style.RESET_ALL)
         
-        print(Fore.CYAN + f"Round #{self.round_number} | Capital: €{self.capital} | Current Bet: €{bet}" + Style.RESET_ALL)
+        print(Fore.CYAN + f"Round #{self.round_number} | Capital: €{self.capital} | Current Bet: €{total_bet}" + Style.RESET_ALL)
         print(Fore.YELLOW + f"Cards in deck: {self.deck_obj.cards_remaining()} ({self.deck_obj.remaining_percentage():.1f}%)" + Style.RESET_ALL)
         
         print(Fore.CYAN + "\n═════════════════════════════════════════════════════" + Style.RESET_ALL)
@@ -573,71 +692,129 @@ class BlackjackGame:
         
         print(Fore.CYAN + "═════════════════════════════════════════════════════" + Style.RESET_ALL)
         
-        display_hand_ascii(self.player.cards, "Player")
-        
-        player_score = self.player.compute_score()
-        score_color = Fore.GREEN if player_score <= 21 else Fore.RED
-        print(score_color + f"Player's Score: {player_score}" + Style.RESET_ALL)
+        if len(self.player.hands) == 1:
+            display_hand_ascii(self.player.cards, "Player")
+            
+            player_score = self.player.compute_score()
+            score_color = Fore.GREEN if player_score <= 21 else Fore.RED
+            print(score_color + f"Player's Score: {player_score}" + Style.RESET_ALL)
+        else:
+            for i, hand in enumerate(self.player.hands):
+                marker = "▶ " if hand is self.player.hand else ""
+                display_hand_ascii(hand.cards, f"{marker}Hand {i + 1}")
+                
+                score_color = Fore.GREEN if hand.score <= 21 else Fore.RED
+                doubled = " (doubled)" if hand.doubled else ""
+                print(score_color + f"Score: {hand.score} | Bet: €{hand.bet}{doubled}" + Style.RESET_ALL)
         
         print(Fore.CYAN + "═════════════════════════════════════════════════════" + Style.RESET_ALL)
 
-    def player_turn(self, bet):
-        player_busted = False
-        first_action = True
+    def offer_split(self, hand):
+        if not hand.can_split() or len(self.player.hands) >= MAX_SPLIT_HANDS:
+            return False
+        
+        self.display_game_screen()
         
+        if self.capital < hand.bet:
+            print(Fore.RED + "❌ You don't have enough capital to split." + Style.RESET_ALL)
+            time.sleep(1)
+            return False
+        
+        print(Fore.YELLOW + "\n💠 You have two cards of the same value!" + Style.RESET_ALL)
+        with self.profiler.phase('decision'):
+            choice = input(Fore.YELLOW + "Do you want to split? (y/n): " + Style.RESET_ALL).lower()
+        
+        if choice != 'y':
+            return False
+        
+        print(Fore.MAGENTA + "\n🔀 Splitting your hand!" + Style.RESET_ALL)
+        self.capital -= hand.bet
+        self.player.split_hand()
+        time.sleep(1)
+        return True
+
+    def player_turn(self, hand):
         while True:
-            self.display_game_screen(bet)
+            self.display_game_screen()
             
-            if self.player.is_busted():
-                player_busted = True
+            if hand.is_busted():
                 print(Fore.RED + "💥 You busted!" + Style.RESET_ALL)
                 time.sleep(1)
                 break
 
+            can_double = hand.can_double() and self.capital >= hand.bet
+
             print("\n" + Fore.YELLOW + "Options:" + Style.RESET_ALL)
             print(Fore.GREEN + "[H]" + Style.RESET_ALL + " Hit  - Take another card")
             print(Fore.RED + "[S]" + Style.RESET_ALL + " Stand - End your turn")
             
-            if first_action and self.capital >= bet:
+            if can_double:
                 print(Fore.MAGENTA + "[D]" + Style.RESET_ALL + " Double Down - Double your bet and take one card")
             
-            choice = input(Fore.YELLOW + "\nYour choice: " + Style.RESET_ALL).lower()
+            with self.profiler.phase('decision'):
+                choice = input(Fore.YELLOW + "\nYour choice: " + Style.RESET_ALL).lower()
 
             if choice in ['h', 'hit']:
                 print(Fore.GREEN + "\n🎯 You chose to hit!" + Style.RESET_ALL)
-                self.deal_card_animated(self.player)
-                first_action = False
+                with self.profiler.phase('deal'):
+                    self.deal_card_animated(self.player)
 
             elif choice in ['s', 'stand']:
                 print(Fore.RED + "\n🛑 You chose to stand!" + Style.RESET_ALL)
                 time.sleep(0.5)
                 break
 
-            elif choice in ['d', 'double'] and first_action and self.capital >= bet:
-                self.capital -= bet
-                bet = bet * 2
+            elif choice in ['d', 'double'] and can_double:
+                self.capital -= hand.bet
+                hand.bet *= 2
+                hand.doubled = True
                 print(Fore.MAGENTA + "\n💰 You doubled down!" + Style.RESET_ALL)
-                self.deal_card_animated(self.player)
+                with self.profiler.phase('deal'):
+                    self.deal_card_animated(self.player)
+                self.display_game_screen()
+                if hand.is_busted():
+                    print(Fore.RED + "💥 You busted!" + Style.RESET_ALL)
                 time.sleep(1)
-                player_busted = self.player.is_busted()
                 break
             else:
                 print(Fore.RED + "\n❌ Invalid choice. Please try again." + Style.RESET_ALL)
                 time.sleep(0.5)
 
-        return bet, player_busted
+    def play_hands(self):
+        index = 0
+        while index < len(self.player.hands):
+            self.player.activate(index)
+            hand = self.player.hand
+            
+            if hand.split:
+                print(Fore.CYAN + f"\n▶️ Playing hand {index + 1} of {len(self.player.hands)}..." + Style.RESET_ALL)
+                time.sleep(1)
+            
+            while True:
+                if len(hand.cards) == 1:
+                    with self.profiler.phase('deal'):
+                        self.deal_card_animated(self.player)
+                if not self.offer_split(hand):
+                    break
+            
+            self.player_turn(hand)
+            index += 1
 
     def dealer_turn(self):
+        with self.profiler.phase('dealer'):
+            self._play_dealer()
+
+    def _play_dealer(self):
         print(Fore.CYAN + "\n🎭 Dealer's turn..." + Style.RESET_ALL)
         time.sleep(0.5)
         
-        self.display_game_screen(0, hide_dealer=False)
+        self.display_game_screen(hide_dealer=False)
         
         while self.dealer.should_hit():
             print(Fore.RED + "Dealer hits!" + Style.RESET_ALL)
             time.sleep(1)
             self.deal_card_animated(self.dealer)
-            self.display_game_screen(0, hide_dealer=False)
+            self.display_game_screen(hide_dealer=False)
             
         if self.dealer.is_busted():
             print(Fore.GREEN + "💥 Dealer busted!" + Style.RESET_ALL)
@@ -646,57 +823,76 @@ class BlackjackGame:
         
         time.sleep(1)
         
-    def determine_winner(self, bet):
-        player_score = self.player.compute_score()
+    def determine_winner(self):
+        with self.profiler.phase('result'):
+            outcomes = self._settle_hands()
+        self.refresh_dashboard()
+        return outcomes
+
+    def _settle_hands(self):
         dealer_score = self.dealer.compute_score()
         
-        self.display_game_screen(bet, hide_dealer=False)
+        self.display_game_screen(hide_dealer=False)
         
         print(Fore.CYAN + "\n╔══════════════════════════════════════╗" + Style.RESET_ALL)
         print(Fore.CYAN + "║             GAME RESULT              ║" + Style.RESET_ALL)
         print(Fore.CYAN + "╚══════════════════════════════════════╝" + Style.RESET_ALL)
         
-        outcome = ""
+        results = []
+        for i, hand in enumerate(self.player.hands):
+            label = f"Hand {i + 1}: " if len(self.player.hands) > 1 else ""
+            outcome = self._settle_hand(hand, dealer_score, label)
+            results.append((outcome, hand.bet))
+        
+        print(Fore.BLUE + f"\nYour capital: €{self.capital}" + Style.RESET_ALL)
+        
+        self.stats.add_hands(results, self.capital)
+        
+        return [outcome for outcome, _ in results]
+
+    def _settle_hand(self, hand, dealer_score, label=""):
+        player_score = hand.score
+        bet = hand.bet
+        
         if player_score > 21:
             self.player.add_loss(bet)
-            print(Fore.RED + "❌ You busted! Dealer wins." + Style.RESET_ALL)
-            outcome = "Bust"
+            print(Fore.RED + f"{label}❌ You busted! Dealer wins." + Style.RESET_ALL)
+            return "Bust"
         elif dealer_score > 21:
             winnings = bet * 2
             self.capital += winnings
             self.player.add_win(winnings)
-            print(Fore.GREEN + f"✅ Dealer busts! You win €{bet}." + Style.RESET_ALL)
-            outcome = "Win"
+            print(Fore.GREEN + f"{label}✅ Dealer busts! You win €{bet}." + Style.RESET_ALL)
+            return "Win"
         elif player_score > dealer_score:
             winnings = bet * 2
             self.capital += winnings
             self.player.add_win(winnings)
-            print(Fore.GREEN + f"✅ You beat the dealer! You win €{bet}." + Style.RESET_ALL)
-            outcome = "Win"
+            print(Fore.GREEN + f"{label}✅ You beat the dealer! You win €{bet}." + Style.RESET_ALL)
+            return "Win"
         elif dealer_score > player_score:
             self.player.add_loss(bet)
-            print(Fore.RED + "❌ Dealer wins with a higher score." + Style.RESET_ALL)
-            outcome = "Lose"
+            print(Fore.RED + f"{label}❌ Dealer wins with a higher score." + Style.RESET_ALL)
+            return "Lose"
         else:
             self.capital += bet  
             self.player.add_tie()
-            print(Fore.YELLOW + "🤝 Push! It's a tie. Your bet is returned." + Style.RESET_ALL)
-            outcome = "Tie"
-        
-        print(Fore.BLUE + f"\nYour capital: €{self.capital}" + Style.RESET_ALL)
-        
-        self.stats.add_round(outcome, self.capital, bet)
-        if self.dashboard_enabled:
-            self.dashboard.update_dashboard()
-        
+            print(Fore.YELLOW + f"{label}🤝 Push! It's a tie. Your bet is returned." + Style.RESET_ALL)
+            return "Tie"
+        
+    def handle_blackjack(self):
+        with self.profiler.phase('result'):
+            outcome = self._settle_naturals(self.player.hand.bet)
+        if outcome is not None:
+            self.refresh_dashboard()
         return outcome
-        
-    def handle_blackjack(self, bet):
+
+    def _settle_naturals(self, bet):
         player_blackjack = self.player.is_blackjack()
         dealer_blackjack = self.dealer.is_blackjack()
         
         if player_blackjack or dealer_blackjack:
-            self.display_game_screen(bet, hide_dealer=False)
+            self.display_game_screen(hide_dealer=False)
             
             print(Fore.CYAN + "\n╔═════════════════════════════════════╗" + Style.RESET_ALL)
             
@@ -708,8 +904,6 @@ class BlackjackGame:
                 print(Fore.YELLOW + "\nBoth you and the dealer have Blackjack! Your bet is returned." + Style.RESET_ALL)
                 
                 self.stats.add_round("Tie", self.capital, bet)
-                if self.dashboard_enabled:
-                    self.dashboard.update_dashboard()
                 return "Tie"
                 
             elif player_blackjack:
@@ -723,8 +917,6 @@ class BlackjackGame:
                 print(Fore.GREEN + f"\n💰 Blackjack pays 3:2! You win €{blackjack_payout - bet}." + Style.RESET_ALL)
                 
                 self.stats.add_round("Blackjack", self.capital, bet)
-                if self.dashboard_enabled:
-                    self.dashboard.update_dashboard()
                 return "Blackjack"
                 
             elif dealer_blackjack:
@@ -734,33 +926,10 @@ class BlackjackGame:
                 print(Fore.RED + "\nDealer has Blackjack. You lose your bet." + Style.RESET_ALL)
                 
                 self.stats.add_round("Lose", self.capital, bet)
-                if self.dashboard_enabled:
-                    self.dashboard.update_dashboard()
                 return "Lose"
         
         return None
         
-    def play_single_hand(self, bet):
-        blackjack_result = self.handle_blackjack(bet)
-        if blackjack_result is not None:
-            return blackjack_result
-            
-        bet, player_busted = self.player_turn(bet)
-        
-        if player_busted:
-            self.display_game_screen(bet, hide_dealer=False)
-            print(Fore.RED + "\n💥 You busted! Dealer wins." + Style.RESET_ALL)
-            self.player.add_loss(bet)
-            
-            self.stats.add_round("Bust", self.capital, bet)
-            if self.dashboard_enabled:
-                self.dashboard.update_dashboard()
-            return "Bust"
-            
-        self.dealer_turn()
-        
-        return self.determine_winner(bet)
-        
     def print_banner(self, text):
         print(Fore.MAGENTA + "╔══════════════════════════════════════════════════╗" + Style.RESET_ALL)
         print(Fore.MAGENTA + f"║{text.center(50)}║" + Style.RESET_ALL)
@@ -771,7 +940,8 @@ class BlackjackGame:
         
         if self.deck_obj.needs_reshuffle():
             print(Fore.MAGENTA + "\n🔄 Reshuffling the deck..." + Style.RESET_ALL)
-            self.deck_obj.reset_deck()
+            with self.profiler.phase('shuffle'):
+                self.deck_obj.reset_deck()
             time.sleep(1)
             
         clear_screen()
@@ -781,7 +951,9 @@ class BlackjackGame:
         while True:
             try:
                 bet_prompt = f"How much do you want to bet? (1-{self.capital}): "
-                bet = int(input(Fore.CYAN + bet_prompt + Style.RESET_ALL))
+                with self.profiler.phase('decision'):
+                    bet_input = input(Fore.CYAN + bet_prompt + Style.RESET_ALL)
+                bet = int(bet_input)
                 if bet <= 0:
                     print(Fore.RED + "❌ The bet must be a positive number." + Style.RESET_ALL)
                 elif bet > self.capital:
@@ -793,46 +965,20 @@ class BlackjackGame:
                 
         self.capital -= bet
         
-        self.deal_initial_cards()
-        self.display_game_screen(bet)
+        self.deal_initial_cards(bet)
+        self.display_game_screen()
         
-        if self.can_split(self.player.cards):
-            if self.capital >= bet:
-                print(Fore.YELLOW + "\n💠 You have two cards of the same value!" + Style.RESET_ALL)
-                choice = input(Fore.YELLOW + "Do you want to split? (y/n): " + Style.RESET_ALL).lower()
-                
-                if choice == 'y':
-                    print(Fore.MAGENTA + "\n🔀 Splitting your hand!" + Style.RESET_ALL)
-                    self.capital -= bet  
-                    original_bet = bet
-                    
-                    first_hand = [self.player.cards[0]]
-                    second_hand = [self.player.cards[1]]
-                    
-                    print(Fore.CYAN + "\n▶️ Playing your first hand..." + Style.RESET_ALL)
-                    time.sleep(1)
-                    self.player.cards = first_hand
-                    self.deal_card_animated(self.player)
-                    self.display_game_screen(original_bet)
-                    outcome1 = self.play_single_hand(original_bet)
-                    
-                    print(Fore.CYAN + "\n▶️ Playing your second hand..." + Style.RESET_ALL)
-                    time.sleep(1)
-                    self.player.cards = second_hand
-                    self.deal_card_animated(self.player)
-                    self.display_game_screen(original_bet)
-                    outcome2 = self.play_single_hand(original_bet)
-                    
-                    self.stats.add_split_round(outcome1, outcome2, self.capital, bet)
-                    if self.dashboard_enabled:
-                        self.dashboard.update_dashboard()
-                    return
-            else:
-                print(Fore.RED + "❌ You don't have enough capital to split." + Style.RESET_ALL)
-                
-        outcome = self.play_single_hand(bet)
-        return outcome
+        blackjack_result = self.handle_blackjack()
+        if blackjack_result is not None:
+            return [blackjack_result]
+        
+        self.play_hands()
+        
+        if not all(hand.is_busted() for hand in self.player.hands):
+            self.dealer_turn()
         
+        return self.determine_winner()
+
     def display_welcome(self):
         clear_screen()
         
@@ -898,6 +1044,9 @@ class BlackjackGame:
         print(f"Best Streak:      {self.player.best_streak}")
         print(f"Worst Streak:     {self.player.worst_streak}")
         
+        if self.profiler.enabled:
+            self.profiler.report()
+        
         print("\n" + Fore.MAGENTA + "Thank you for playing Mario's Blackjack!" + Style.RESET_ALL)
         
         if self.dashboard_enabled:
@@ -912,8 +1061,7 @@ class BlackjackGame:
         while self.capital > 0:
             self.play_round()
             
-            if self.dashboard_enabled:
-                self.dashboard.update_dashboard()
+            self.refresh_dashboard()
             
             if self.capital <= 0:
                 print(Fore.RED + "\n💸 You have no more capital. Game over!" + Style.RESET_ALL)
@@ -952,5 +1100,5 @@ if __name__ == "__main__":
         except ValueError:
             print(Fore.RED + "❌ Please enter a valid number." + Style.RESET_ALL)
     
-    game = BlackjackGame(initial_capital=initial_capital)
+    game = BlackjackGame(initial_capital=initial_capital, profile='--profile' in sys.argv)
     game.run()
@@ -1,82 +1,897 @@
 import pygame
 import sys
+import os
 import random
+import signal
 import math
-from collections import deque
-
-
-
-
+import time
+import argparse
+import asyncio
+import struct
+import csv
+import json
+import hashlib
+import heapq
+from array import array
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mario's Pacman")
+    parser.add_argument("--headless", action="store_true", help="run the simulation without a window or frame cap")
+    parser.add_argument("--ticks", type=int, default=0, help="stop a headless run after this many ticks (0 = until game over)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the headless random player")
+    parser.add_argument("--envs", type=int, default=1, help="number of games stepped in lockstep by a headless run")
+    parser.add_argument("--fps", type=int, default=60, help="render rate cap; the simulation always runs at 30 ticks/s")
+    parser.add_argument("--map", default=DEFAULT_MAP, help="maze text file: # wall, . pellet, space empty, P Pacman start, G ghost start")
+    parser.add_argument("--generate", metavar="COLSxROWS", default=None, help="play a generated maze of this size instead of --map (seeded by --seed)")
+    parser.add_argument("--planning", choices=["sync", "async", "lockstep"], default=None,
+                        help="where ghost paths are computed (default: async in a window, sync headless; async becomes lockstep while recording)")
+    parser.add_argument("--record", metavar="FILE", default=None, help="write the seed, map and every input of this game to FILE")
+    parser.add_argument("--replay", metavar="FILE", default=None, help="replay a recording as fast as possible, drawn in a window or --headless")
+    parser.add_argument("--scale", type=int, default=1, help="window size as a whole multiple of the native 20 px tiles")
+    parser.add_argument("--window", metavar="WxH", default=None, help="window size in pixels; the game is scaled to fit and letterboxed")
+    parser.add_argument("--fullscreen", action="store_true", help="scale the game to the whole screen")
+    parser.add_argument("--smooth", action="store_true", help="scale with smoothscale to the exact fit instead of whole-pixel nearest")
+    parser.add_argument("--profile-csv", metavar="FILE", default=None, help="write per-frame phase timings to FILE (press F3 in game for the overlay)")
+    parser.add_argument("--ghost-pairs", type=int, default=4, help="ghosts are spawned in pairs; the classic game has 4 pairs")
+    parser.add_argument("--serve", metavar="PORT", type=int, default=None, help="run an authoritative multiplayer server on localhost:PORT")
+    parser.add_argument("--connect", metavar="HOST:PORT", default=None, help="connect --bots bot players to a running server")
+    parser.add_argument("--players", type=int, default=4, help="Pacmen per multiplayer match; a match starts once it is full")
+    parser.add_argument("--bots", type=int, default=0, help="bot clients to run, inside the server process with --serve or against --connect")
+    return parser.parse_args()
+
+
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps")
+DEFAULT_MAP = os.path.join(MAPS_DIR, "classic.txt")
+NAV_CACHE_DIR = os.path.join(MAPS_DIR, ".navcache")
+NAV_CACHE_VERSION = 1
+args = parse_args()
 pygame.init()
 FPS = 30
-clock = pygame.time.Clock()
+TICK_MS = 1000 / FPS
+MAX_FRAME_MS = 250
+INPUT_POLL_MS = 1
 block_size = 20
-MAP_ROWS = 23
-MAP_COLS = 21
+HUD_HEIGHT = 40
 RIGHT = 4
 UP = 3
 LEFT = 2
 DOWN = 1
+EMPTY = 0
+WALL = 1
+PELLET = 2
+EATEN = 3
 BLACK = (0, 0, 0)
 WALL_COLOR = (52, 45, 202)
 WALL_INNER_COLOR = (0, 0, 0)
 FOOD_COLOR = (254, 184, 151)
 PACMAN_COLOR = (255, 255, 0)
 GHOST_COLOR = (255, 0, 0)
+RANGE_RING_COLOR = (255, 100, 100)
+SPRITE_COLORKEY = (255, 0, 255)
 TEXT_COLOR = (255, 255, 255)
-WIDTH = block_size * MAP_COLS
-HEIGHT = block_size * MAP_ROWS + 40
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Mario's Pacman")
-
-
-
-game_map_layout = [
-    [1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1],
-    [1,2,2,2,2,2,2,2,2,2,1,2,2,2,2,2,2,2,2,2,1],
-    [1,2,1,1,1,2,1,1,1,2,1,2,1,1,1,2,1,1,1,2,1],
-    [1,2,1,1,1,2,1,1,1,2,1,2,1,1,1,2,1,1,1,2,1],
-    [1,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,1],
-    [1,2,1,1,1,2,1,2,1,1,1,1,1,2,1,2,1,1,1,2,1],
-    [1,2,2,2,2,2,1,2,2,2,1,2,2,2,1,2,2,2,2,2,1],
-    [1,1,1,1,1,2,1,1,1,2,1,2,1,1,1,2,1,1,1,1,1],
-    [0,0,0,0,1,2,1,2,2,2,2,2,2,2,1,2,1,0,0,0,0],
-    [1,1,1,1,1,2,1,2,1,1,2,1,1,2,1,2,1,1,1,1,1],
-    [2,2,2,2,2,2,2,2,1,2,2,2,1,2,2,2,2,2,2,2,2],
-    [1,1,1,1,1,2,1,2,1,2,2,2,1,2,1,2,1,1,1,1,1],
-    [0,0,0,0,1,2,1,2,1,1,1,1,1,2,1,2,1,0,0,0,0],
-    [0,0,0,0,1,2,1,2,2,2,2,2,2,2,1,2,1,0,0,0,0],
-    [1,1,1,1,1,2,2,2,1,1,1,1,1,2,2,2,1,1,1,1,1],
-    [1,2,2,2,2,2,2,2,2,2,1,2,2,2,2,2,2,2,2,2,1],
-    [1,2,1,1,1,2,1,1,1,2,1,2,1,1,1,2,1,1,1,2,1],
-    [1,2,2,2,1,2,2,2,2,2,1,2,2,2,2,2,1,2,2,2,1],
-    [1,1,2,2,1,2,1,2,1,1,1,1,1,2,1,2,1,2,2,1,1],
-    [1,2,2,2,2,2,1,2,2,2,1,2,2,2,1,2,2,2,2,2,1],
-    [1,2,1,1,1,1,1,1,1,2,1,2,1,1,1,1,1,1,1,2,1],
-    [1,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,1],
-    [1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1]
-]
+RANDOM_TARGET_TICKS = 10 * FPS
+DENSE_TABLE_MAX_CELLS = 1024
+HIERARCHICAL_MIN_CELLS = 256 * 256
+CLUSTER_SIZE = 16
+LONG_ENTRANCE = 6
+CHASE_FIELD_DEPTH = 64
+FIELD_CACHE_SIZE = 1024
+RING_CACHE_MAX_RADIUS = 512
+FRAME_BUDGET_MS = 1000 / FPS
+PROFILE_PHASES = ["events", "pacman", "ghosts", "collision", "background", "sprites", "hud", "flip"]
+PROFILE_GROUPS = {"update": ["pacman", "ghosts", "collision"], "draw": ["background", "sprites", "hud", "flip"]}
+# log-spaced histogram bin edges in ms; the last bin holds everything over the frame budget
+PROFILE_BIN_EDGES = [0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, FRAME_BUDGET_MS]
+OVERLAY_REFRESH_FRAMES = 15
+# multiplayer wire format: server frames are length-prefixed, client inputs are fixed-size
+MSG_SNAPSHOT = 1
+MSG_DELTA = 2
+MSG_END = 3
+MSG_INPUT = 4
+FRAME_LENGTH = struct.Struct("<I")
+SNAPSHOT_HEADER = struct.Struct("<BIBBHHH")
+DELTA_HEADER = struct.Struct("<BIHHB")
+END_HEADER = struct.Struct("<BI")
+ACTOR_RECORD = struct.Struct("<HffB")
+PELLET_RECORD = struct.Struct("<HH")
+PLAYER_RECORD = struct.Struct("<BIB")
+INPUT_MESSAGE = struct.Struct("<BB")
+SEND_BUFFER_LIMIT = 256 * 1024
+# bots all connect at once; past the listen backlog the kernel drops the handshake silently
+SERVER_BACKLOG = 1024
+SNAPSHOT_TIMEOUT_MS = 5000
+SERVER_REPORT_TICKS = 5 * FPS
+GOAL_CACHE_SIZE = 16
+ROUTE_CACHE_SIZE = 4096
+MAP_SYMBOLS = {"#": WALL, ".": PELLET, " ": EMPTY, "P": PELLET, "G": PELLET}
 
 
 
+ghost_count = 4
 
-random_targets = [
-
-
-
-    (block_size, block_size),
-    (block_size, (MAP_ROWS - 2) * block_size),
-    ((MAP_COLS - 2) * block_size, block_size),
-    ((MAP_COLS - 2) * block_size, (MAP_ROWS - 2) * block_size)
-]
 
+DIRECTION_DELTAS = [(LEFT, -1, 0), (RIGHT, 1, 0), (UP, 0, -1), (DOWN, 0, 1)]
+
+
+def build_neighbours(walls):
+    # cells are numbered row * cols + col; each entry lists (direction, cell) for the open neighbours
+    rows, cols = walls.shape
+    wall_rows = walls.tolist()
+    neighbours = [[] for _ in range(rows * cols)]
+    for y in range(rows):
+        for x in range(cols):
+            for d, dx, dy in DIRECTION_DELTAS:
+                nx, ny = x + dx, y + dy
+                if 0 <= ny < rows and 0 <= nx < cols and not wall_rows[ny][nx]:
+                    neighbours[y * cols + x].append((d, ny * cols + nx))
+    return neighbours
+
+
+def build_next_hop_table(neighbours):
+    # table[from_cell, to_cell] holds the first move of the BFS path (0 = stay)
+    cell_count = len(neighbours)
+    table = np.zeros((cell_count, cell_count), dtype=np.uint8)
+    for start in range(cell_count):
+        first_move = bytearray(cell_count)
+        visited = bytearray(cell_count)
+        visited[start] = 1
+        for d, cell in neighbours[start]:
+            visited[cell] = 1
+            first_move[cell] = d
+        queue = deque(cell for _, cell in neighbours[start])
+        while queue:
+            current = queue.popleft()
+            move = first_move[current]
+            for _, cell in neighbours[current]:
+                if not visited[cell]:
+                    visited[cell] = 1
+                    first_move[cell] = move
+                    queue.append(cell)
+        table[start] = np.frombuffer(first_move, dtype=np.uint8)
+    return table
+
+
+class FlowField:
+    # BFS distances from Pacman, cut off after max_depth steps so the cost per update does not
+    # grow with the maze; ghosts beyond that horizon keep patrolling. The searches are shared
+    # through the maze, so games on the same maze reuse each other's fields
+    def __init__(self, maze, max_depth=CHASE_FIELD_DEPTH):
+        self.cache = maze.chase_fields
+        self.rows = maze.rows
+        self.cols = maze.cols
+        self.wall_rows = maze.wall_rows
+        self.max_depth = max_depth
+        self.distance = {}
+        self.truncated = False
+        self.target = None
+
+
+    def update(self, target_x, target_y):
+        if (target_x, target_y) == self.target:
+            return
+        self.target = (target_x, target_y)
+        key = (target_x, target_y, self.max_depth)
+        field = self.cache.get(key)
+        if field is None:
+            field = self.search(target_x, target_y)
+            self.cache[key] = field
+            if len(self.cache) > FIELD_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        self.distance, self.truncated = field
+
+
+    def search(self, target_x, target_y):
+        distance = {}
+        truncated = False
+        rows, cols, wall_rows = self.rows, self.cols, self.wall_rows
+        if 0 <= target_x < cols and 0 <= target_y < rows:
+            distance[target_y * cols + target_x] = 0
+            queue = deque([(target_x, target_y)])
+            while queue:
+                x, y = queue.popleft()
+                step = distance[y * cols + x] + 1
+                if step > self.max_depth:
+                    truncated = True
+                    break
+                for _, dx, dy in DIRECTION_DELTAS:
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < cols and 0 <= ny < rows and not wall_rows[ny][nx]:
+                        cell = ny * cols + nx
+                        if cell not in distance:
+                            distance[cell] = step
+                            queue.append((nx, ny))
+        return distance, truncated
+
+
+    def beyond_horizon(self, x, y):
+        return self.truncated and 0 <= x < self.cols and 0 <= y < self.rows and y * self.cols + x not in self.distance
+
+
+    def direction_from(self, x, y, fallback):
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return fallback
+        best_distance = self.distance.get(y * self.cols + x, -1)
+        if best_distance <= 0:
+            return fallback
+        best = fallback
+        for d, dx, dy in DIRECTION_DELTAS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.cols and 0 <= ny < self.rows and not self.wall_rows[ny][nx]:
+                distance = self.distance.get(ny * self.cols + nx, -1)
+                if 0 <= distance < best_distance:
+                    best = d
+                    best_distance = distance
+        return best
+
+
+OPPOSITE = {LEFT: RIGHT, RIGHT: LEFT, UP: DOWN, DOWN: UP}
+JUNCTION_TABLE_MAX = 2048
+UNREACHABLE = 1 << 30
+
+
+def build_junction_graph(neighbours, walls):
+    # junctions are the open cells that are not plain corridor cells (degree != 2); every run of
+    # corridor cells between two junctions collapses into one weighted edge, and each corridor
+    # cell remembers both of its end junctions so queries can start and stop mid-corridor
+    cell_count = len(neighbours)
+    node_index = [-1] * cell_count
+    corridor = [-1] * cell_count
+    corridor_pos = [0] * cell_count
+    anchor_node = [[-1] * cell_count, [-1] * cell_count]
+    anchor_dist = [[0] * cell_count, [0] * cell_count]
+    anchor_dir = [[0] * cell_count, [0] * cell_count]
+    anchor_entry = [[0] * cell_count, [0] * cell_count]
+    nodes = []
+    edges = []
+    corridor_count = 0
+
+    def add_node(cell):
+        node_index[cell] = len(nodes)
+        nodes.append(cell)
+
+    def walk_from(start):
+        nonlocal corridor_count
+        u = node_index[start]
+        for d, cell in neighbours[start]:
+            if node_index[cell] >= 0:
+                edges.append((u, node_index[cell], 1, d))
+                continue
+            if corridor[cell] >= 0:
+                continue
+            # moves[i] is the direction taken to enter path[i]; the last one enters the end junction
+            path = []
+            moves = [d]
+            prev, current = start, cell
+            while node_index[current] < 0:
+                path.append(current)
+                for move, following in neighbours[current]:
+                    if following != prev:
+                        break
+                moves.append(move)
+                prev, current = current, following
+            v = node_index[current]
+            length = len(path) + 1
+            back_entry = OPPOSITE[moves[-1]]
+            for pos, cell_on_path in enumerate(path):
+                corridor[cell_on_path] = corridor_count
+                corridor_pos[cell_on_path] = pos
+                anchor_node[0][cell_on_path] = u
+                anchor_dist[0][cell_on_path] = pos + 1
+                anchor_dir[0][cell_on_path] = OPPOSITE[moves[pos]]
+                anchor_entry[0][cell_on_path] = d
+                anchor_node[1][cell_on_path] = v
+                anchor_dist[1][cell_on_path] = length - pos - 1
+                anchor_dir[1][cell_on_path] = moves[pos + 1]
+                anchor_entry[1][cell_on_path] = back_entry
+            corridor_count += 1
+            if u != v:
+                edges.append((u, v, length, d))
+                edges.append((v, u, length, back_entry))
+
+    open_cells = np.flatnonzero(~walls.ravel()).tolist()
+    for cell in open_cells:
+        if len(neighbours[cell]) != 2:
+            add_node(cell)
+    for start in list(nodes):
+        walk_from(start)
+    # rings with no junction at all get one picked arbitrarily
+    for cell in open_cells:
+        if node_index[cell] < 0 and corridor[cell] < 0:
+            add_node(cell)
+            walk_from(cell)
+
+    arrays = {
+        "nodes": np.array(nodes, dtype=np.int32),
+        "node_index": np.array(node_index, dtype=np.int32),
+        "corridor": np.array(corridor, dtype=np.int32),
+        "corridor_pos": np.array(corridor_pos, dtype=np.int32),
+        "anchor_node": np.array(anchor_node, dtype=np.int32),
+        "anchor_dist": np.array(anchor_dist, dtype=np.int32),
+        "anchor_dir": np.array(anchor_dir, dtype=np.uint8),
+        "anchor_entry": np.array(anchor_entry, dtype=np.uint8),
+        "edges": np.array(edges, dtype=np.int32).reshape(-1, 4),
+    }
+    if len(nodes) <= JUNCTION_TABLE_MAX:
+        adjacency = junction_adjacency(len(nodes), arrays["edges"])
+        distance = np.empty((len(nodes), len(nodes)), dtype=np.int32)
+        first_move = np.empty((len(nodes), len(nodes)), dtype=np.uint8)
+        for source in range(len(nodes)):
+            distance[source], first_move[source] = junction_dijkstra(adjacency, source)
+        arrays["distance"] = distance
+        arrays["first_move"] = first_move
+    return arrays
+
+
+def junction_adjacency(node_count, edges):
+    adjacency = [[] for _ in range(node_count)]
+    for u, v, weight, direction in edges.tolist():
+        adjacency[u].append((v, weight, direction))
+    return adjacency
+
+
+def junction_dijkstra(adjacency, source):
+    distance = [UNREACHABLE] * len(adjacency)
+    first_move = [0] * len(adjacency)
+    distance[source] = 0
+    heap = [(0, source)]
+    while heap:
+        dist, u = heapq.heappop(heap)
+        if dist > distance[u]:
+            continue
+        for v, weight, direction in adjacency[u]:
+            if dist + weight < distance[v]:
+                distance[v] = dist + weight
+                first_move[v] = direction if u == source else first_move[u]
+                heapq.heappush(heap, (distance[v], v))
+    return distance, first_move
+
+
+class JunctionGraph:
+    def __init__(self, arrays):
+        self.node_index = arrays["node_index"].tolist()
+        self.corridor = arrays["corridor"].tolist()
+        self.corridor_pos = arrays["corridor_pos"].tolist()
+        self.anchor_node = arrays["anchor_node"].tolist()
+        self.anchor_dist = arrays["anchor_dist"].tolist()
+        self.anchor_dir = arrays["anchor_dir"].tolist()
+        self.anchor_entry = arrays["anchor_entry"].tolist()
+        self.node_count = len(arrays["nodes"])
+        self.distance = arrays.get("distance")
+        self.first_move = arrays.get("first_move")
+        self.adjacency = None
+        self.rows = {}
+        if self.distance is None:
+            self.adjacency = junction_adjacency(self.node_count, arrays["edges"])
+
+
+    def row(self, node):
+        if self.distance is not None:
+            return self.distance[node], self.first_move[node]
+        # too many junctions for the full table: search from this junction on demand and keep the row
+        if node not in self.rows:
+            if len(self.rows) >= JUNCTION_TABLE_MAX:
+                self.rows.clear()
+            self.rows[node] = junction_dijkstra(self.adjacency, node)
+        return self.rows[node]
+
+
+    def anchors(self, cell):
+        # (junction, distance to it, move towards it, move out of it towards the cell)
+        if self.node_index[cell] >= 0:
+            return [(self.node_index[cell], 0, 0, 0)]
+        if self.corridor[cell] < 0:
+            return []
+        return [(self.anchor_node[k][cell], self.anchor_dist[k][cell], self.anchor_dir[k][cell], self.anchor_entry[k][cell]) for k in (0, 1)]
+
+
+    def next_direction(self, start, goal):
+        if start == goal:
+            return 0
+        best_cost = UNREACHABLE
+        best_move = 0
+        if self.corridor[start] >= 0 and self.corridor[start] == self.corridor[goal]:
+            offset = self.corridor_pos[goal] - self.corridor_pos[start]
+            best_cost = abs(offset)
+            best_move = self.anchor_dir[1][start] if offset > 0 else self.anchor_dir[0][start]
+        goal_anchors = self.anchors(goal)
+        for start_node, start_dist, start_move, _ in self.anchors(start):
+            distance, first_move = self.row(start_node)
+            for goal_node, goal_dist, _, goal_entry in goal_anchors:
+                cost = start_dist + int(distance[goal_node]) + goal_dist
+                if cost < best_cost:
+                    best_cost = cost
+                    if start_dist:
+                        best_move = start_move
+                    elif start_node != goal_node:
+                        best_move = int(first_move[goal_node])
+                    else:
+                        best_move = goal_entry
+        return best_move
+
+
+NO_PATH = 0xFFFF
+
+
+def local_bfs(wall_rows, bounds, start_x, start_y):
+    # distances from one cell to every cell of the cluster, without leaving the cluster
+    x0, y0, x1, y1 = bounds
+    width = x1 - x0
+    distance = array("H", [NO_PATH]) * (width * (y1 - y0))
+    distance[(start_y - y0) * width + start_x - x0] = 0
+    queue = deque([(start_x, start_y)])
+    while queue:
+        x, y = queue.popleft()
+        step = distance[(y - y0) * width + x - x0] + 1
+        for _, dx, dy in DIRECTION_DELTAS:
+            nx, ny = x + dx, y + dy
+            if x0 <= nx < x1 and y0 <= ny < y1 and not wall_rows[ny][nx]:
+                index = (ny - y0) * width + nx - x0
+                if distance[index] == NO_PATH:
+                    distance[index] = step
+                    queue.append((nx, ny))
+    return distance
+
+
+def cluster_bounds(cluster, clusters_x, size, rows, cols):
+    cluster_y, cluster_x = divmod(cluster, clusters_x)
+    x0 = cluster_x * size
+    y0 = cluster_y * size
+    return (x0, y0, min(x0 + size, cols), min(y0 + size, rows))
+
+
+def build_cluster_graph(wall_rows, rows, cols, size=CLUSTER_SIZE):
+    # abstract graph for hierarchical pathfinding: nodes are entrance cells on cluster borders,
+    # linked across the border with weight 1 and to the other entrances of their cluster with
+    # the in-cluster walking distance
+    clusters_x = -(-cols // size)
+    node_of = {}
+    entrances = []
+    edges = []
+
+    def node(x, y):
+        cell = y * cols + x
+        if cell not in node_of:
+            node_of[cell] = len(entrances)
+            entrances.append(cell)
+        return node_of[cell]
+
+    def flush(run, crossing):
+        # one crossing in the middle of a short opening, one at each end of a long one
+        if not run:
+            return
+        picks = [run[len(run) // 2]] if len(run) < LONG_ENTRANCE else [run[0], run[-1]]
+        for (ax, ay), (bx, by) in picks:
+            a = node(ax, ay)
+            b = node(bx, by)
+            edges.append((a, b, 1, crossing))
+            edges.append((b, a, 1, OPPOSITE[crossing]))
+        run.clear()
+
+    for x in range(size, cols, size):
+        run = []
+        for y in range(rows):
+            if y % size == 0:
+                flush(run, RIGHT)
+            if not wall_rows[y][x - 1] and not wall_rows[y][x]:
+                run.append(((x - 1, y), (x, y)))
+            else:
+                flush(run, RIGHT)
+        flush(run, RIGHT)
+    for y in range(size, rows, size):
+        run = []
+        for x in range(cols):
+            if x % size == 0:
+                flush(run, DOWN)
+            if not wall_rows[y - 1][x] and not wall_rows[y][x]:
+                run.append(((x, y - 1), (x, y)))
+            else:
+                flush(run, DOWN)
+        flush(run, DOWN)
+
+    members = {}
+    for n, cell in enumerate(entrances):
+        y, x = divmod(cell, cols)
+        members.setdefault((y // size) * clusters_x + x // size, []).append(n)
+    for cluster, nodes in members.items():
+        bounds = cluster_bounds(cluster, clusters_x, size, rows, cols)
+        width = bounds[2] - bounds[0]
+        for a in nodes:
+            ay, ax = divmod(entrances[a], cols)
+            distance = local_bfs(wall_rows, bounds, ax, ay)
+            for b in nodes:
+                if b != a:
+                    by, bx = divmod(entrances[b], cols)
+                    d = distance[(by - bounds[1]) * width + bx - bounds[0]]
+                    if d != NO_PATH:
+                        edges.append((a, b, d, 0))
+    return {
+        "cluster_size": np.array(size, dtype=np.int32),
+        "entrances": np.array(entrances, dtype=np.int32),
+        "edges": np.array(edges, dtype=np.int32).reshape(-1, 4),
+    }
+
+
+class HierarchicalPlanner:
+    # HPA*: entrances and in-cluster distances are precomputed once per maze; a query searches the
+    # small entrance graph (shared by every ghost heading to the same goal) and only refines the
+    # route into single moves inside the cluster the ghost is standing in
+    def __init__(self, maze, arrays):
+        self.wall_rows = maze.wall_rows
+        self.rows = maze.rows
+        self.cols = maze.cols
+        self.size = int(arrays["cluster_size"])
+        self.clusters_x = -(-self.cols // self.size)
+        self.entrances = arrays["entrances"].tolist()
+        self.adjacency = [[] for _ in self.entrances]
+        # converted in slices: one tolist() over every edge would hold the GIL long enough to
+        # stall the main loop when this runs on the planner thread
+        edges = arrays["edges"]
+        for begin in range(0, len(edges), 4096):
+            for u, v, weight, direction in edges[begin:begin + 4096].tolist():
+                self.adjacency[u].append((v, weight, direction))
+        self.cluster_entrances = {}
+        for node, cell in enumerate(self.entrances):
+            self.cluster_entrances.setdefault(self.cluster_of(cell), []).append(node)
+        self.fields = OrderedDict()
+        self.goals = OrderedDict()
+
+
+    def cluster_of(self, cell):
+        y, x = divmod(cell, self.cols)
+        return (y // self.size) * self.clusters_x + x // self.size
+
+
+    def bounds(self, cluster):
+        return cluster_bounds(cluster, self.clusters_x, self.size, self.rows, self.cols)
+
+
+    def local_index(self, bounds, cell):
+        y, x = divmod(cell, self.cols)
+        return (y - bounds[1]) * (bounds[2] - bounds[0]) + x - bounds[0]
+
+
+    def cluster_fields(self, cluster):
+        # in-cluster distances to each entrance of the cluster, only computed once a ghost is there
+        fields = self.fields.get(cluster)
+        if fields is None:
+            bounds = self.bounds(cluster)
+            fields = {}
+            for node in self.cluster_entrances.get(cluster, ()):
+                y, x = divmod(self.entrances[node], self.cols)
+                fields[node] = local_bfs(self.wall_rows, bounds, x, y)
+            self.fields[cluster] = fields
+            if len(self.fields) > FIELD_CACHE_SIZE:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(cluster)
+        return fields
+
+
+    def goal(self, goal):
+        # distance from every entrance to the goal, plus the first move of that route
+        record = self.goals.get(goal)
+        if record is not None:
+            self.goals.move_to_end(goal)
+            return record
+        cluster = self.cluster_of(goal)
+        bounds = self.bounds(cluster)
+        y, x = divmod(goal, self.cols)
+        local = local_bfs(self.wall_rows, bounds, x, y)
+        distance = [UNREACHABLE] * len(self.entrances)
+        via = [-1] * len(self.entrances)
+        next_move = [0] * len(self.entrances)
+        heap = []
+        for node in self.cluster_entrances.get(cluster, ()):
+            d = local[self.local_index(bounds, self.entrances[node])]
+            if d != NO_PATH:
+                distance[node] = d
+                heap.append((d, node))
+        heapq.heapify(heap)
+        while heap:
+            dist, u = heapq.heappop(heap)
+            if dist > distance[u]:
+                continue
+            for v, weight, direction in self.adjacency[u]:
+                if dist + weight < distance[v]:
+                    distance[v] = dist + weight
+                    via[v] = u
+                    next_move[v] = OPPOSITE[direction] if direction else 0
+                    heapq.heappush(heap, (distance[v], v))
+        record = (cluster, local, distance, via, next_move)
+        self.goals[goal] = record
+        if len(self.goals) > GOAL_CACHE_SIZE:
+            self.goals.popitem(last=False)
+        return record
+
+
+    def descend(self, field, bounds, cell):
+        y, x = divmod(cell, self.cols)
+        x0, y0, x1, y1 = bounds
+        width = x1 - x0
+        here = field[(y - y0) * width + x - x0]
+        for d, dx, dy in DIRECTION_DELTAS:
+            nx, ny = x + dx, y + dy
+            if x0 <= nx < x1 and y0 <= ny < y1 and field[(ny - y0) * width + nx - x0] == here - 1:
+                return d
+        return 0
+
+
+    def next_direction(self, start, goal):
+        if start == goal:
+            return 0
+        goal_cluster, local, distance, via, next_move = self.goal(goal)
+        cluster = self.cluster_of(start)
+        bounds = self.bounds(cluster)
+        index = self.local_index(bounds, start)
+        best_cost = UNREACHABLE
+        best_field = None
+        best_node = -1
+        if cluster == goal_cluster and local[index] != NO_PATH:
+            best_cost = local[index]
+            best_field = local
+        fields = self.cluster_fields(cluster)
+        for node, field in fields.items():
+            if field[index] != NO_PATH and field[index] + distance[node] < best_cost:
+                best_cost = field[index] + distance[node]
+                best_field = field
+                best_node = node
+        if best_field is None:
+            return 0
+        if best_node < 0 or best_field[index] > 0:
+            return self.descend(best_field, bounds, start)
+        # standing on the entrance: follow the next edge of the abstract route
+        if next_move[best_node]:
+            return next_move[best_node]
+        if via[best_node] < 0:
+            return self.descend(local, bounds, start)
+        return self.descend(fields[via[best_node]], bounds, start)
+
+
+def load_nav_cache(key, kind):
+    path = os.path.join(NAV_CACHE_DIR, f"{key}-{kind}.npz")
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_nav_cache(key, kind, arrays):
+    # the cache is only an optimisation, so a read-only checkout simply rebuilds every run
+    path = os.path.join(NAV_CACHE_DIR, f"{key}-{kind}.npz")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(NAV_CACHE_DIR, exist_ok=True)
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+def parse_map(text):
+    lines = text.splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
+    if not lines:
+        raise ValueError("map is empty")
+    width = max(len(line) for line in lines)
+    layout = []
+    pacman_spawn = None
+    ghost_spawns = []
+    for y, line in enumerate(lines):
+        row = []
+        for x, char in enumerate(line.ljust(width)):
+            if char not in MAP_SYMBOLS:
+                raise ValueError(f"unknown map symbol {char!r} at line {y + 1}, column {x + 1}")
+            row.append(MAP_SYMBOLS[char])
+            if char == "P":
+                pacman_spawn = (x, y)
+            elif char == "G":
+                ghost_spawns.append((x, y))
+        layout.append(row)
+    if pacman_spawn is None:
+        raise ValueError("map has no Pacman start (P)")
+    if not ghost_spawns:
+        raise ValueError("map has no ghost start (G)")
+    return layout, pacman_spawn, ghost_spawns
+
+
+class Maze:
+    def __init__(self, layout, pacman_spawn, ghost_spawns):
+        self.tiles = np.array(layout, dtype=np.uint8)
+        self.rows, self.cols = self.tiles.shape
+        self.walls = self.tiles == WALL
+        # bit x of wall_bits[y] is set when tile (x, y) is a wall
+        self.wall_rows = self.walls.tolist()
+        self.wall_bits = [sum(1 << x for x, wall in enumerate(row) if wall) for row in self.wall_rows]
+        self.pellet_count = int(np.count_nonzero(self.tiles == PELLET))
+        self.pacman_spawn = pacman_spawn
+        self.ghost_spawns = ghost_spawns
+        corners = [(1, 1), (1, self.rows - 2), (self.cols - 2, 1), (self.cols - 2, self.rows - 2)]
+        self.scatter_targets = [self.nearest_open_cell(x, y) for x, y in corners]
+        # navigation data only depends on the walls, so that is what the cache is keyed by
+        digest = hashlib.sha1(f"{NAV_CACHE_VERSION}:{self.rows}x{self.cols}:".encode())
+        digest.update(np.packbits(self.walls).tobytes())
+        self.key = digest.hexdigest()
+        self.chase_fields = OrderedDict()
+        self.routes = OrderedDict()
+        self._neighbours = None
+        self._next_hop_table = None
+        self._junctions = None
+        self._hierarchy = None
+
+
+    def nearest_open_cell(self, x, y):
+        open_y, open_x = np.nonzero(~self.walls)
+        if len(open_x) == 0:
+            return (x, y)
+        best = int(np.argmin(np.abs(open_x - x) + np.abs(open_y - y)))
+        return (int(open_x[best]), int(open_y[best]))
+
+
+    @property
+    def neighbours(self):
+        if self._neighbours is None:
+            self._neighbours = build_neighbours(self.walls)
+        return self._neighbours
+
+
+    @property
+    def next_hop_table(self):
+        if self._next_hop_table is None:
+            cached = load_nav_cache(self.key, "hops")
+            if cached is None or cached["table"].shape != (self.rows * self.cols,) * 2:
+                cached = {"table": build_next_hop_table(self.neighbours)}
+                save_nav_cache(self.key, "hops", cached)
+            self._next_hop_table = cached["table"]
+        return self._next_hop_table
+
+
+    @property
+    def junctions(self):
+        if self._junctions is None:
+            cached = load_nav_cache(self.key, "junctions")
+            if cached is None or cached["node_index"].shape != (self.rows * self.cols,):
+                cached = build_junction_graph(self.neighbours, self.walls)
+                save_nav_cache(self.key, "junctions", cached)
+            self._junctions = JunctionGraph(cached)
+        return self._junctions
+
+
+    @property
+    def hierarchy(self):
+        if self._hierarchy is None:
+            cached = load_nav_cache(self.key, "clusters")
+            if cached is None or int(cached["cluster_size"]) != CLUSTER_SIZE:
+                cached = build_cluster_graph(self.wall_rows, self.rows, self.cols)
+                save_nav_cache(self.key, "clusters", cached)
+            self._hierarchy = HierarchicalPlanner(self, cached)
+        return self._hierarchy
+
+
+    def next_direction(self, start_x, start_y, dest_x, dest_y):
+        # first move towards the destination, 0 when already there or unreachable; small mazes use
+        # the dense cell-to-cell table, medium ones the junction graph, whose size grows with the
+        # number of intersections instead of the square of the cell count, and very large ones
+        # the cluster hierarchy, whose routes are near-shortest rather than exact
+        start = start_y * self.cols + start_x
+        goal = dest_y * self.cols + dest_x
+        cell_count = self.rows * self.cols
+        if cell_count <= DENSE_TABLE_MAX_CELLS:
+            return int(self.next_hop_table[start, goal])
+        # ghosts bunch up on the same few scatter targets, so recent answers are shared between them
+        key = (start, goal)
+        move = self.routes.get(key)
+        if move is not None:
+            self.routes.move_to_end(key)
+            return move
+        if cell_count < HIERARCHICAL_MIN_CELLS:
+            move = self.junctions.next_direction(start, goal)
+        else:
+            move = self.hierarchy.next_direction(start, goal)
+        self.routes[key] = move
+        if len(self.routes) > ROUTE_CACHE_SIZE:
+            self.routes.popitem(last=False)
+        return move
+
+
+    def hits_wall(self, x, y, size):
+        # same four-corner test as before, done on integer tile coordinates; corners off the map never collide
+        left = int(x // block_size)
+        right = int((x + size - 1) // block_size)
+        top = int(y // block_size)
+        bottom = int((y + size - 1) // block_size)
+        left_in = 0 <= left < self.cols
+        right_in = 0 <= right < self.cols
+        for row in (top, bottom):
+            if 0 <= row < self.rows:
+                bits = self.wall_bits[row]
+                if (left_in and bits >> left & 1) or (right_in and bits >> right & 1):
+                    return True
+        return False
 
 
-score = 0
-lives = 3
-ghost_count = 4
-def copy_map(m):
-    return [row[:] for row in m]
+def generate_maze(cols, rows, seed=None, loop_chance=0.15, ghost_spawn_count=16):
+    # recursive backtracker over the odd tiles, then a share of the remaining inner walls is
+    # knocked out so the maze has loops to run around like a Pacman level
+    cols = max(5, cols | 1)
+    rows = max(5, rows | 1)
+    rng = random.Random(seed)
+    cell_cols, cell_rows = cols // 2, rows // 2
+    tiles = np.full((rows, cols), WALL, dtype=np.uint8)
+    tiles[1::2, 1::2] = PELLET
+    visited = bytearray(cell_cols * cell_rows)
+    visited[0] = 1
+    stack = [(0, 0)]
+    carved = []
+    while stack:
+        cx, cy = stack[-1]
+        options = [(nx, ny) for nx, ny in ((cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1))
+                   if 0 <= nx < cell_cols and 0 <= ny < cell_rows and not visited[ny * cell_cols + nx]]
+        if not options:
+            stack.pop()
+            continue
+        nx, ny = options[rng.randrange(len(options))]
+        visited[ny * cell_cols + nx] = 1
+        carved.append((cy + ny + 1, cx + nx + 1))
+        stack.append((nx, ny))
+    if carved:
+        carved_rows, carved_cols = zip(*carved)
+        tiles[list(carved_rows), list(carved_cols)] = PELLET
+    # walls with an odd coordinate sum sit between two cells; the border is never opened
+    row_index, col_index = np.indices(tiles.shape)
+    between = (tiles == WALL) & ((row_index + col_index) % 2 == 1)
+    between[[0, -1], :] = False
+    between[:, [0, -1]] = False
+    noise = np.random.default_rng(seed).random(tiles.shape)
+    tiles[between & (noise < loop_chance)] = PELLET
+    far_cells = [(2 * cx + 1, 2 * cy + 1) for cy in range(cell_rows) for cx in range(cell_cols) if cx + cy >= (cell_cols + cell_rows) // 4]
+    ghost_spawns = rng.sample(far_cells, min(ghost_spawn_count, len(far_cells))) or [(1, 1)]
+    return Maze(tiles, (1, 1), ghost_spawns)
+
+
+mazes = {}
+
+
+def load_maze(path):
+    # every game on the same map file shares one Maze, which is never mutated
+    path = os.path.abspath(path)
+    if path not in mazes:
+        with open(path, encoding="utf-8") as f:
+            mazes[path] = Maze(*parse_map(f.read()))
+    return mazes[path]
+
+
+def map_name(path):
+    path = os.path.abspath(path)
+    try:
+        return os.path.relpath(path, MAPS_DIR).replace(os.sep, "/")
+    except ValueError:
+        # another drive on Windows has no relative path
+        return path
+
+
+def maze_from_args():
+    if args.generate:
+        cols, rows = (int(size) for size in args.generate.lower().split("x"))
+        return generate_maze(cols, rows, args.seed)
+    return load_maze(args.map)
+
+
+def planning_from_args():
+    planning = args.planning or ("sync" if args.headless else "async")
+    # a free-running worker answers whenever it gets to it, which a recording cannot reproduce
+    if planning == "async" and args.record:
+        planning = "lockstep"
+    return planning
 
 
 
@@ -86,6 +901,8 @@ class Pacman:
     def __init__(self, x, y, size, speed):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.size = size
         self.speed = speed
         self.direction = RIGHT
@@ -118,94 +935,100 @@ class Pacman:
             self.animation_timer = 0
 
 
-    def move_forwards(self):
+    def move_forwards(self, distance=None):
+        distance = self.speed if distance is None else distance
         if self.direction == RIGHT:
-            self.x += self.speed
+            self.x += distance
         elif self.direction == UP:
-            self.y -= self.speed
+            self.y -= distance
         elif self.direction == LEFT:
-            self.x -= self.speed
+            self.x -= distance
         elif self.direction == DOWN:
-            self.y += self.speed
+            self.y += distance
 
 
-    def move_backwards(self):
+    def move_backwards(self, distance=None):
+        distance = self.speed if distance is None else distance
         if self.direction == RIGHT:
-            self.x -= self.speed
+            self.x -= distance
         elif self.direction == UP:
-            self.y += self.speed
+            self.y += distance
         elif self.direction == LEFT:
-            self.x += self.speed
+            self.x += distance
         elif self.direction == DOWN:
-            self.y -= self.speed
-
+            self.y -= distance
 
-    def check_collisions(self, game_map):
-        corners = [
-            (self.x, self.y),
-            (self.x + self.size - 1, self.y),
-            (self.x, self.y + self.size - 1),
-            (self.x + self.size - 1, self.y + self.size - 1)
-        ]
 
-
-        for cx, cy in corners:
-            map_x = int(cx // block_size)
-            map_y = int(cy // block_size)
-            if map_y < 0 or map_y >= len(game_map) or map_x < 0 or map_x >= len(game_map[0]):
-                continue
-            if game_map[map_y][map_x] == 1:
-                return True
-        return False
+    def check_collisions(self, maze):
+        return maze.hits_wall(self.x, self.y, self.size)
     
 
 
-    def change_direction_if_possible(self, game_map):
+    def change_direction_if_possible(self, maze, distance=None):
         if self.direction == self.next_direction:
             return
         original_direction = self.direction
         self.direction = self.next_direction
-        self.move_forwards()
-        if self.check_collisions(game_map):
-            self.move_backwards()
+        self.move_forwards(distance)
+        if self.check_collisions(maze):
+            self.move_backwards(distance)
             self.direction = original_direction
         else:
-            self.move_backwards()
+            self.move_backwards(distance)
 
 
 
-    def move_process(self, game_map):
-        self.change_direction_if_possible(game_map)
-        self.move_forwards()
-        if self.check_collisions(game_map):
-            self.move_backwards()
+    def move_process(self, maze, turns=()):
+        # the tick is split into one-pixel sub-steps so a buffered turn is taken at the exact
+        # position where the corridor opens; turns are (fraction of the tick, direction) pairs
+        # and only become visible from the sub-step in which they were pressed
+        self.prev_x = self.x
+        self.prev_y = self.y
+        steps = max(1, math.ceil(self.speed))
+        step_size = self.speed / steps
+        pending = deque(turns)
+        for i in range(steps):
+            while pending and pending[0][0] * steps <= i:
+                self.next_direction = pending.popleft()[1]
+            self.change_direction_if_possible(maze, step_size)
+            self.move_forwards(step_size)
+            if self.check_collisions(maze):
+                self.move_backwards(step_size)
+        if pending:
+            self.next_direction = pending[-1][1]
 
 
 
     def eat(self, game_map):
-        global score
         map_x = self.get_map_x()
         map_y = self.get_map_y()
-        if map_y < 0 or map_y >= len(game_map) or map_x < 0 or map_x >= len(game_map[0]):
-            return
-        if game_map[map_y][map_x] == 2:
-            game_map[map_y][map_x] = 3
-            score += 1
+        rows, cols = game_map.shape
+        if map_y < 0 or map_y >= rows or map_x < 0 or map_x >= cols:
+            return None
+        if game_map[map_y, map_x] == PELLET:
+            game_map[map_y, map_x] = EATEN
+            return (map_x, map_y)
+        return None
+
+
 
 
+    def render_position(self, alpha):
+        return (self.prev_x + (self.x - self.prev_x) * alpha, self.prev_y + (self.y - self.prev_y) * alpha)
 
 
-    def draw(self, surface):
-        center = (int(self.x + self.size / 2), int(self.y + self.size / 2))
+    def draw(self, surface, atlas, alpha=1.0):
+        x, y = self.render_position(alpha)
+        center = (int(x + self.size / 2), int(y + self.size / 2))
         radius = self.size // 2
-        open_angle = (self.current_frame / self.frame_count) * 45
-        pygame.draw.circle(surface, PACMAN_COLOR, center, radius)
+        sprite = atlas.pacman[self.direction][self.current_frame]
+        return surface.blit(sprite, (center[0] - radius, center[1] - radius))
 
 
 
 
 class Ghost:
-    def __init__(self, x, y, size, speed, range_radius, target_index=0):
+    def __init__(self, x, y, size, speed, range_radius, targets, target_index=0, start_tick=0):
         self.x = x
         self.y = y
         self.size = size
@@ -213,8 +1036,11 @@ class Ghost:
         self.direction = RIGHT
         self.range_radius = range_radius
         self.random_target_index = target_index
-        self.target = random_targets[self.random_target_index]
-        self.last_random_change = pygame.time.get_ticks()
+        self.prev_x = x
+        self.prev_y = y
+        self.targets = targets
+        self.target = targets[self.random_target_index]
+        self.last_random_change = start_tick
 
 
 
@@ -234,21 +1060,8 @@ class Ghost:
         return int((self.y + self.size - 1) // block_size)
     
 
-    def check_collisions(self, game_map):
-        corners = [
-            (self.x, self.y),
-            (self.x + self.size - 1, self.y),
-            (self.x, self.y + self.size - 1),
-            (self.x + self.size - 1, self.y + self.size - 1)
-        ]
-        for cx, cy in corners:
-            map_x = int(cx // block_size)
-            map_y = int(cy // block_size)
-            if map_y < 0 or map_y >= len(game_map) or map_x < 0 or map_x >= len(game_map[0]):
-                continue
-            if game_map[map_y][map_x] == 1:
-                return True
-        return False
+    def check_collisions(self, maze):
+        return maze.hits_wall(self.x, self.y, self.size)
     
 
 
@@ -281,63 +1094,104 @@ class Ghost:
         return distance <= self.range_radius
     
 
-    def change_random_direction(self):
-        self.random_target_index = (self.random_target_index + 1) % len(random_targets)
-        self.target = random_targets[self.random_target_index]
+    def is_aligned(self):
+        if self.direction in (LEFT, RIGHT):
+            return self.x % block_size == 0
+        return self.y % block_size == 0
 
 
-    def calculate_new_direction(self, game_map, dest_x, dest_y):
-        start = (self.get_map_x(), self.get_map_y())
-        queue = deque()
-        queue.append((start, []))
-        visited = set()
-        visited.add(start)
-        while queue:
-            current, moves = queue.popleft()
-            if current == (dest_x, dest_y):
-                return moves[0] if moves else self.direction
-            for d, (dx, dy) in zip([LEFT, RIGHT, UP, DOWN], [(-1, 0), (1, 0), (0, -1), (0, 1)]):
-                nx, ny = current[0] + dx, current[1] + dy
-                if 0 <= ny < len(game_map) and 0 <= nx < len(game_map[0]):
-                    if game_map[ny][nx] != 1 and (nx, ny) not in visited:
-                        visited.add((nx, ny))
-                        queue.append(((nx, ny), moves + [d]))
-        return self.direction
+    def next_aligned_tile(self):
+        map_x = self.get_map_x()
+        map_y = self.get_map_y()
+        if self.direction == RIGHT and self.x % block_size:
+            map_x += 1
+        elif self.direction == DOWN and self.y % block_size:
+            map_y += 1
+        return map_x, map_y
+
+
+    def change_random_direction(self):
+        self.random_target_index = (self.random_target_index + 1) % len(self.targets)
+        self.target = self.targets[self.random_target_index]
+
+
+    def calculate_new_direction(self, env, dest_x, dest_y):
+        rows = env.maze.rows
+        cols = env.maze.cols
+        start_x = self.get_map_x()
+        start_y = self.get_map_y()
+        if env.planner.executor is not None:
+            # answers come back a tick after they are asked for, so ask for the tile the ghost
+            # lines up with next while it is still on its way there, and only turn once it has
+            start_x, start_y = self.next_aligned_tile()
+        if not (0 <= start_x < cols and 0 <= start_y < rows and 0 <= dest_x < cols and 0 <= dest_y < rows):
+            return self.direction
+        move = env.planner.direction(self, start_x, start_y, dest_x, dest_y)
+        if env.planner.executor is not None and not self.is_aligned():
+            return self.direction
+        if move is None:
+            return None
+        return move if move else self.direction
     
 
-    def change_direction_if_possible(self, game_map, pacman):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_random_change > 10000:
+    def change_direction_if_possible(self, env):
+        if env.tick_count - self.last_random_change > RANDOM_TARGET_TICKS:
             self.change_random_direction()
-            self.last_random_change = current_time
-        if self.is_in_range(pacman):
-            dest = (pacman.get_map_x(), pacman.get_map_y())
+            self.last_random_change = env.tick_count
+        field = env.chase_field_for(self)
+        planned = field is None or field.beyond_horizon(self.get_map_x(), self.get_map_y())
+        if not planned:
+            new_dir = field.direction_from(self.get_map_x(), self.get_map_y(), self.direction)
         else:
-            dest = (int(self.target[0] // block_size), int(self.target[1] // block_size))
-        new_dir = self.calculate_new_direction(game_map, dest[0], dest[1])
+            new_dir = self.calculate_new_direction(env, self.target[0], self.target[1])
+            if new_dir is None:
+                # lined up before its answer came back: wait here rather than run past the turn
+                return False
         old_dir = self.direction
         self.direction = new_dir
         self.move_forwards()
-        if self.check_collisions(game_map):
+        if self.check_collisions(env.maze):
             self.move_backwards()
             self.direction = old_dir
+            # a turn that fails even though the ghost is lined up was planned for somewhere else
+            if planned and self.is_aligned():
+                env.planner.forget(self)
         else:
             self.move_backwards()
+        return True
 
 
-    def move_process(self, game_map, pacman):
-        self.change_direction_if_possible(game_map, pacman)
+    def move_process(self, env):
+        self.prev_x = self.x
+        self.prev_y = self.y
+        if not self.change_direction_if_possible(env):
+            return
         self.move_forwards()
-        if self.check_collisions(game_map):
+        if self.check_collisions(env.maze):
             self.move_backwards()
 
 
 
-    def draw(self, surface):
-        center = (int(self.x + self.size / 2), int(self.y + self.size / 2))
+    def render_position(self, alpha):
+        return (self.prev_x + (self.x - self.prev_x) * alpha, self.prev_y + (self.y - self.prev_y) * alpha)
+
+
+    def draw(self, surface, atlas, alpha=1.0):
+        x, y = self.render_position(alpha)
+        center = (int(x + self.size / 2), int(y + self.size / 2))
         radius = self.size // 2
-        pygame.draw.circle(surface, GHOST_COLOR, center, radius)
-        pygame.draw.circle(surface, (255, 100, 100), center, int(self.range_radius * block_size), 1)
+        body_rect = surface.blit(atlas.ghost, (center[0] - radius, center[1] - radius))
+        ring_radius = int(self.range_radius * block_size)
+        ring = atlas.ring(ring_radius)
+        # only the visible arc is blitted and reported dirty, so big rings do not dirty the whole map
+        bounds = ring_bounds(surface.get_clip(), center, ring_radius)
+        if bounds is None:
+            range_rect = body_rect
+        elif ring is None:
+            range_rect = pygame.draw.circle(surface, RANGE_RING_COLOR, center, ring_radius, 1)
+        else:
+            range_rect = surface.blit(ring, bounds, bounds.move(ring_radius - center[0], ring_radius - center[1]))
+        return body_rect.union(range_rect)
 
 
 
@@ -347,130 +1201,1283 @@ def draw_walls(surface, game_map):
     
     wall_space_width = block_size / 1.6
     wall_offset = (block_size - wall_space_width) / 2
-    for row in range(len(game_map)):
-        for col in range(len(game_map[0])):
-            if game_map[row][col] == 1:
+    walls = (np.asarray(game_map) == WALL).tolist()
+    for row in range(len(walls)):
+        for col in range(len(walls[0])):
+            if walls[row][col]:
                 rect = pygame.Rect(col * block_size, row * block_size, block_size, block_size)
                 pygame.draw.rect(surface, WALL_COLOR, rect)
-                if col > 0 and game_map[row][col - 1] == 1:
+                if col > 0 and walls[row][col - 1]:
                     inner_rect = pygame.Rect(col * block_size, row * block_size + wall_offset, wall_space_width + wall_offset, wall_space_width)
                     pygame.draw.rect(surface, WALL_INNER_COLOR, inner_rect)
-                if col < len(game_map[0]) - 1 and game_map[row][col + 1] == 1:
+                if col < len(walls[0]) - 1 and walls[row][col + 1]:
                     inner_rect = pygame.Rect(col * block_size + wall_offset, row * block_size + wall_offset, wall_space_width + wall_offset, wall_space_width)
                     pygame.draw.rect(surface, WALL_INNER_COLOR, inner_rect)
-                if row < len(game_map) - 1 and game_map[row + 1][col] == 1:
+                if row < len(walls) - 1 and walls[row + 1][col]:
                     inner_rect = pygame.Rect(col * block_size + wall_offset, row * block_size + wall_offset, wall_space_width, wall_space_width + wall_offset)
                     pygame.draw.rect(surface, WALL_INNER_COLOR, inner_rect)
-                if row > 0 and game_map[row - 1][col] == 1:
+                if row > 0 and walls[row - 1][col]:
                     inner_rect = pygame.Rect(col * block_size + wall_offset, row * block_size, wall_space_width, wall_space_width + wall_offset)
                     pygame.draw.rect(surface, WALL_INNER_COLOR, inner_rect)
 
 
+def draw_food(surface, row, col):
+    food_rect = pygame.Rect(col * block_size + block_size / 3, row * block_size + block_size / 3, block_size / 3, block_size / 3)
+    pygame.draw.rect(surface, FOOD_COLOR, food_rect)
+
+
 def draw_foods(surface, game_map):
-    for row in range(len(game_map)):
-        for col in range(len(game_map[0])):
-            if game_map[row][col] == 2:
-                food_rect = pygame.Rect(col * block_size + block_size / 3, row * block_size + block_size / 3, block_size / 3, block_size / 3)
-                pygame.draw.rect(surface, FOOD_COLOR, food_rect)
+    for row, col in np.argwhere(np.asarray(game_map) == PELLET).tolist():
+        draw_food(surface, row, col)
+
+
+
+DIRECTION_ANGLES = {RIGHT: 0, UP: 90, LEFT: 180, DOWN: 270}
 
 
+def ring_bounds(clip, center, radius):
+    # bounding box of the part of a circle outline that falls inside clip, or None when it misses;
+    # found from the circle's extreme points and its crossings with the (slightly grown) clip edges
+    cx, cy = center
+    area = clip.inflate(4, 4)
+    points = [(x, y) for x, y in ((cx - radius, cy), (cx + radius, cy), (cx, cy - radius), (cx, cy + radius)) if area.collidepoint(x, y)]
+    for x in (area.left, area.right):
+        if abs(x - cx) <= radius:
+            dy = math.sqrt(radius * radius - (x - cx) ** 2)
+            points += [(x, y) for y in (cy - dy, cy + dy) if area.top <= y <= area.bottom]
+    for y in (area.top, area.bottom):
+        if abs(y - cy) <= radius:
+            dx = math.sqrt(radius * radius - (y - cy) ** 2)
+            points += [(x, y) for x in (cx - dx, cx + dx) if area.left <= x <= area.right]
+    if not points:
+        return None
+    left = int(min(x for x, _ in points)) - 2
+    top = int(min(y for _, y in points)) - 2
+    bounds = pygame.Rect(left, top, int(max(x for x, _ in points)) + 3 - left, int(max(y for _, y in points)) + 3 - top).clip(clip)
+    return bounds if bounds else None
 
-def draw_score_and_lives(surface):
-    font = pygame.font.SysFont("Arial", 20)
-    score_text = font.render("Score: " + str(score), True, TEXT_COLOR)
-    surface.blit(score_text, (10, block_size * MAP_ROWS + 10))
-    lives_text = font.render("Lives: ", True, TEXT_COLOR)
-    surface.blit(lives_text, (WIDTH - 150, block_size * MAP_ROWS + 10))
-    for i in range(lives):
-        pygame.draw.circle(surface, PACMAN_COLOR, (WIDTH - 80 + i * (block_size + 5), block_size * MAP_ROWS + 20), block_size // 2)
 
 
+class SpriteAtlas:
+    # every actor image is drawn once and blitted from then on; colour-keyed RLE surfaces blit
+    # faster than pygame.draw even for the thin range rings, and much faster than per-pixel alpha
+    def __init__(self, size, frame_count=7):
+        self.size = size
+        # pacman[direction][frame] for frames 1..frame_count, the mouth opening as the frame grows
+        self.pacman = {direction: [None] + [self.pacman_frame(direction, frame / frame_count * 45) for frame in range(1, frame_count + 1)]
+                       for direction in DIRECTION_ANGLES}
+        self.ghost = self.blank(size, size)
+        pygame.draw.circle(self.ghost, GHOST_COLOR, (size // 2, size // 2), size // 2)
+        self.rings = {}
+
 
-def create_new_pacman():
-    return Pacman(block_size, block_size, block_size, block_size / 5)
+    def blank(self, width, height):
+        surface = pygame.Surface((width, height)).convert()
+        surface.fill(SPRITE_COLORKEY)
+        surface.set_colorkey(SPRITE_COLORKEY, pygame.RLEACCEL)
+        return surface
 
 
-def create_ghosts():
+    def pacman_frame(self, direction, open_angle):
+        surface = self.blank(self.size, self.size)
+        center = (self.size // 2, self.size // 2)
+        radius = self.size // 2
+        pygame.draw.circle(surface, PACMAN_COLOR, center, radius)
+        heading = math.radians(DIRECTION_ANGLES[direction])
+        spread = math.radians(open_angle)
+        reach = radius + 2
+        mouth = [center] + [(center[0] + reach * math.cos(heading + spread * t), center[1] - reach * math.sin(heading + spread * t))
+                            for t in (-1, -0.5, 0, 0.5, 1)]
+        pygame.draw.polygon(surface, SPRITE_COLORKEY, mouth)
+        return surface
+
+
+    def ring(self, radius):
+        # huge rings would cost more memory than they save in drawing, so those are left to the caller
+        ring = self.rings.get(radius)
+        if ring is None and radius <= RING_CACHE_MAX_RADIUS:
+            ring = self.blank(2 * radius + 1, 2 * radius + 1)
+            pygame.draw.circle(ring, RANGE_RING_COLOR, (radius, radius), radius, 1)
+            self.rings[radius] = ring
+        return ring
+
+
+
+class Hud:
+    def __init__(self, rect):
+        self.rect = rect
+        self.surface = pygame.Surface(rect.size)
+        self.surface.fill(BLACK)
+        font = pygame.font.SysFont("Arial", 20)
+        self.score_label = font.render("Score: ", True, TEXT_COLOR)
+        self.lives_label = font.render("Lives: ", True, TEXT_COLOR)
+        self.digits = [font.render(str(digit), True, TEXT_COLOR) for digit in range(10)]
+        # the lives keep 160 px on the right, or half the row on a map too narrow for that; each
+        # side draws clipped to its own rect, so on a very narrow map they are cut off, not overlapped
+        lives_width = min(160, rect.width // 2)
+        self.score_rect = pygame.Rect(0, 0, rect.width - lives_width, rect.height)
+        self.lives_rect = pygame.Rect(self.score_rect.right, 0, lives_width, rect.height)
+        self.score = None
+        self.lives = None
+
+
+    def render_score(self, value):
+        self.surface.set_clip(self.score_rect)
+        self.surface.fill(BLACK)
+        self.surface.blit(self.score_label, (10, 10))
+        x = 10 + self.score_label.get_width()
+        for char in str(value):
+            glyph = self.digits[int(char)]
+            self.surface.blit(glyph, (x, 10))
+            x += glyph.get_width()
+        self.surface.set_clip(None)
+
+
+    def render_lives(self, value):
+        self.surface.set_clip(self.lives_rect)
+        self.surface.fill(BLACK)
+        x = self.lives_rect.x + 10
+        self.surface.blit(self.lives_label, (x, 10))
+        # lives start 80 px from the right edge, as on a wide row, but never over the label
+        x = max(x + self.lives_label.get_width() + block_size // 2, self.lives_rect.right - 80)
+        for i in range(value):
+            pygame.draw.circle(self.surface, PACMAN_COLOR, (x + i * (block_size + 5), 20), block_size // 2)
+        self.surface.set_clip(None)
+
+
+    def update(self, score, lives):
+        # returns the screen rects that changed since the last call
+        changed = []
+        if score != self.score:
+            self.score = score
+            self.render_score(score)
+            changed.append(self.score_rect.move(self.rect.topleft))
+        if lives != self.lives:
+            self.lives = lives
+            self.render_lives(lives)
+            changed.append(self.lives_rect.move(self.rect.topleft))
+        return changed
+
+
+
+def merge_rects(rects):
+    # overlapping dirty rects (a sprite's old and new position, mostly) are scaled once, not twice
+    merged = []
+    for rect in rects:
+        if not rect:
+            continue
+        rect = rect.copy()
+        i = rect.collidelist(merged)
+        while i >= 0:
+            rect.union_ip(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+
+class Renderer:
+    # everything is drawn at native tile resolution; when the window has another size the frame is
+    # kept offscreen and only its dirty parts are scaled up, so the drawing cost does not depend on
+    # the window's pixel count
+    def __init__(self, display, game_map, smooth=False):
+        rows, cols = game_map.shape
+        native_size = (cols * block_size, rows * block_size + HUD_HEIGHT)
+        self.smooth = smooth
+        self.display = display
+        self.surface = display if display.get_size() == native_size else pygame.Surface(native_size).convert()
+        self.viewport = self.fit(display)
+        surface = self.surface
+        self.wall_layer = pygame.Surface(surface.get_size())
+        self.wall_layer.fill(BLACK)
+        draw_walls(self.wall_layer, game_map)
+        self.background = self.wall_layer.copy()
+        draw_foods(self.background, game_map)
+        self.map_rect = pygame.Rect(0, 0, cols * block_size, rows * block_size)
+        self.hud_rect = pygame.Rect(0, self.map_rect.bottom, surface.get_width(), surface.get_height() - self.map_rect.bottom)
+        self.hud = Hud(self.hud_rect)
+        self.atlas = SpriteAtlas(block_size)
+        self.sprite_rects = []
+        self.dirty_rects = []
+        self.full_redraw = True
+        self.profiler = NULL_PROFILER
+
+
+    def fit(self, display):
+        # nearest scaling keeps to whole multiples (letterboxed) so every tile stays square and sharp
+        native_width, native_height = self.surface.get_size()
+        width, height = display.get_size()
+        factor = min(width / native_width, height / native_height)
+        if not self.smooth and factor >= 1:
+            factor = int(factor)
+        size = (int(native_width * factor), int(native_height * factor))
+        return pygame.Rect(((width - size[0]) // 2, (height - size[1]) // 2), size)
+
+
+    def resize(self, display):
+        if self.surface is self.display:
+            self.surface = pygame.Surface(self.surface.get_size()).convert()
+            self.surface.blit(self.display, (0, 0))
+        self.display = display
+        self.viewport = self.fit(display)
+        self.full_redraw = True
+
+
+    def to_window(self, rect):
+        scale_x = self.viewport.width / self.surface.get_width()
+        scale_y = self.viewport.height / self.surface.get_height()
+        left = self.viewport.x + math.floor(rect.left * scale_x)
+        top = self.viewport.y + math.floor(rect.top * scale_y)
+        return pygame.Rect(left, top, self.viewport.x + math.ceil(rect.right * scale_x) - left, self.viewport.y + math.ceil(rect.bottom * scale_y) - top)
+
+
+    def present(self, dirty_rects):
+        if self.surface is self.display:
+            if self.full_redraw:
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty_rects)
+            return
+        if self.full_redraw or self.smooth or self.viewport.width < self.surface.get_width():
+            # smoothscale filters across rect edges and a fractional shrink samples differently per
+            # rect, so both redo the whole frame; whole-multiple nearest scaling is exact piecewise
+            if self.full_redraw:
+                self.display.fill(BLACK)
+            scale = pygame.transform.smoothscale if self.smooth else pygame.transform.scale
+            scale(self.surface, self.viewport.size, self.display.subsurface(self.viewport))
+            if self.full_redraw:
+                pygame.display.flip()
+            else:
+                pygame.display.update(self.viewport)
+            return
+        bounds = self.surface.get_rect()
+        window_rects = []
+        for rect in merge_rects(rect.clip(bounds) for rect in dirty_rects):
+            target = self.to_window(rect).clip(self.viewport)
+            if target:
+                pygame.transform.scale(self.surface.subsurface(rect), target.size, self.display.subsurface(target))
+                window_rects.append(target)
+        pygame.display.update(window_rects)
+
+
+    def clear_pellet(self, map_x, map_y):
+        tile_rect = pygame.Rect(map_x * block_size, map_y * block_size, block_size, block_size)
+        self.background.blit(self.wall_layer, tile_rect, tile_rect)
+        self.surface.blit(self.background, tile_rect, tile_rect)
+        self.dirty_rects.append(tile_rect)
+
+
+    def draw(self, env, alpha=1.0):
+        pacman = env.pacman
+        ghosts = env.ghosts
+        profiler = self.profiler
+        if self.full_redraw:
+            self.surface.blit(self.background, (0, 0))
+        else:
+            for rect in self.sprite_rects:
+                self.surface.blit(self.background, rect, rect)
+        dirty_rects = self.dirty_rects + self.sprite_rects
+        profiler.mark("background")
+        # sprites (mostly the ghost range rings) are clipped to the maze so they never touch the HUD
+        self.surface.set_clip(self.map_rect)
+        self.sprite_rects = [ghost.draw(self.surface, self.atlas, alpha).clip(self.map_rect) for ghost in ghosts]
+        self.sprite_rects.append(pacman.draw(self.surface, self.atlas, alpha).clip(self.map_rect))
+        if profiler.visible:
+            self.sprite_rects.append(self.surface.blit(profiler.overlay(), (4, 4)).clip(self.map_rect))
+        self.surface.set_clip(None)
+        dirty_rects.extend(self.sprite_rects)
+        profiler.mark("sprites")
+        hud_rects = self.hud.update(env.score, env.lives)
+        if self.full_redraw or hud_rects:
+            self.surface.blit(self.hud.surface, self.hud_rect)
+            dirty_rects.extend(hud_rects)
+        profiler.mark("hud")
+        self.present(dirty_rects)
+        self.full_redraw = False
+        self.dirty_rects = []
+        profiler.mark("flip")
+
+
+
+def create_new_pacman(maze):
+    spawn_x, spawn_y = maze.pacman_spawn
+    return Pacman(spawn_x * block_size, spawn_y * block_size, block_size, block_size / 5)
+
+
+def create_ghosts(maze, count=ghost_count, start_tick=0):
     ghosts = []
-    for i in range(ghost_count * 2):
-        init_x = 9 * block_size + (0 if i % 2 == 0 else 1) * block_size
-        init_y = 10 * block_size + (0 if i % 2 == 0 else 1) * block_size
+    targets = maze.scatter_targets
+    for i in range(count * 2):
+        spawn_x, spawn_y = maze.ghost_spawns[i % len(maze.ghost_spawns)]
         ghost_speed = (block_size / 5) / 2
         range_radius = 6 + i
-        ghosts.append(Ghost(init_x, init_y, block_size, ghost_speed, range_radius, target_index=i % len(random_targets)))
+        ghosts.append(Ghost(spawn_x * block_size, spawn_y * block_size, block_size, ghost_speed, range_radius, targets, target_index=i % len(targets), start_tick=start_tick))
     return ghosts
 
 
 
-def update_game(pacman, ghosts, game_map):
-    pacman.move_process(game_map)
-    pacman.eat(game_map)
-    for ghost in ghosts:
-        ghost.move_process(game_map, pacman)
-    for ghost in ghosts:
-        if ghost.get_map_x() == pacman.get_map_x() and ghost.get_map_y() == pacman.get_map_y():
-            handle_ghost_collision()
-            break
+planner_pool = None
 
 
+def shared_planner_pool():
+    # a single worker: every maze keeps its search caches in plain dicts that are not thread-safe,
+    # and the point is to keep pathfinding off the main thread rather than to parallelise it
+    global planner_pool
+    if planner_pool is None:
+        planner_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ghost-planner")
+    return planner_pool
 
-def draw_game(pacman, ghosts, game_map):
-    screen.fill(BLACK)
-    draw_walls(screen, game_map)
-    draw_foods(screen, game_map)
-    for ghost in ghosts:
-        ghost.draw(screen)
-    pacman.draw(screen)
-    draw_score_and_lives(screen)
-    pygame.display.flip()
 
+def shutdown_planner_pool():
+    global planner_pool
+    if planner_pool is not None:
+        planner_pool.shutdown(wait=False, cancel_futures=True)
+        planner_pool = None
 
 
 
-def handle_ghost_collision():
-    global lives, pacman_obj, ghosts_obj, game_map
-    lives -= 1
-    pacman_obj = create_new_pacman()
-    ghosts_obj = create_ghosts()
-    if lives <= 0:
-        print("Game Over! Final Score:", score)
-        pygame.quit()
-        sys.exit()
-game_map = copy_map(game_map_layout)
-pacman_obj = create_new_pacman()
-ghosts_obj = create_ghosts()
-running = True
+class GhostPlanner:
+    # path queries for the ghosts, split into request and response: with an executor a query runs
+    # on the worker and its answer is collected at the start of the next tick, so ghosts ask ahead
+    # for the tile they line up with next; without one the answer comes back immediately. In
+    # lockstep the next tick waits for every answer, so the game no longer depends on timing
+    def __init__(self, maze, executor=None, lockstep=False):
+        self.maze = maze
+        self.executor = executor
+        self.lockstep = lockstep
+        self.pending = {}
+        self.answers = {}
+
+
+    def direction(self, ghost, start_x, start_y, dest_x, dest_y):
+        # a ghost keeps its last answer until it or its target moves to another tile; a new maze
+        # comes with a new planner, so answers never outlive the walls they were computed on
+        key = (start_x, start_y, dest_x, dest_y)
+        answer = self.answers.get(ghost)
+        if answer is not None and answer[0] == key:
+            return answer[1]
+        if self.executor is None:
+            move = self.maze.next_direction(*key)
+            self.answers[ghost] = (key, move)
+            return move
+        self.request(ghost, key)
+        return None
+
+
+    def request(self, ghost, key):
+        pending = self.pending.get(ghost)
+        if pending is not None:
+            if pending[0] == key:
+                return
+            pending[1].cancel()
+        self.pending[ghost] = (key, self.executor.submit(self.maze.next_direction, *key))
+
+
+    def collect(self):
+        for ghost, (key, future) in list(self.pending.items()):
+            if self.lockstep or future.done():
+                del self.pending[ghost]
+                if not future.cancelled():
+                    self.answers[ghost] = (key, future.result())
+
+
+    def forget(self, ghost):
+        self.answers.pop(ghost, None)
+
+
+    def reset(self):
+        for _, future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.answers.clear()
+
+
+
+class PacmanEnv:
+    # observation channels: walls, pellets, pacman, ghosts (ghost count per tile)
+    OBSERVATION_CHANNELS = 4
+
+
+    def __init__(self, maze=None, lives=3, ghost_count=ghost_count, planning="sync"):
+        self.maze = maze if maze is not None else load_maze(args.map)
+        self.start_lives = lives
+        self.ghost_count = ghost_count
+        self.chase_field = FlowField(self.maze)
+        self.planner = GhostPlanner(self.maze, None if planning == "sync" else shared_planner_pool(), lockstep=planning == "lockstep")
+        self.profiler = NULL_PROFILER
+        self.reset()
+
+
+    def reset(self):
+        self.game_map = self.maze.tiles.copy()
+        self.pellets_remaining = self.maze.pellet_count
+        self.score = 0
+        self.lives = self.start_lives
+        self.tick_count = 0
+        self.done = False
+        self.level_complete = False
+        self.eaten_tiles = []
+        self.chase_field.target = None
+        self.planner.reset()
+        self.pacman = create_new_pacman(self.maze)
+        self.ghosts = create_ghosts(self.maze, self.ghost_count)
+        return self.observe()
+
+
+    def handle_ghost_collision(self):
+        self.lives -= 1
+        self.pacman = create_new_pacman(self.maze)
+        self.ghosts = create_ghosts(self.maze, self.ghost_count, self.tick_count)
+        self.planner.reset()
+        if self.lives <= 0:
+            self.done = True
+
+
+    def chase_field_for(self, ghost):
+        return self.chase_field if ghost.is_in_range(self.pacman) else None
+
+
+    def update(self, turns=()):
+        profiler = self.profiler
+        profiler.start()
+        self.tick_count += 1
+        pacman = self.pacman
+        pacman.move_process(self.maze, turns)
+        eaten_tile = pacman.eat(self.game_map)
+        if eaten_tile:
+            self.score += 1
+            self.pellets_remaining -= 1
+            self.eaten_tiles.append(eaten_tile)
+            if self.pellets_remaining == 0:
+                self.level_complete = True
+                self.done = True
+                profiler.mark("pacman")
+                return
+        profiler.mark("pacman")
+        self.chase_field.update(pacman.get_map_x(), pacman.get_map_y())
+        self.planner.collect()
+        for ghost in self.ghosts:
+            ghost.move_process(self)
+        profiler.mark("ghosts")
+        for ghost in self.ghosts:
+            if ghost.get_map_x() == pacman.get_map_x() and ghost.get_map_y() == pacman.get_map_y():
+                self.handle_ghost_collision()
+                break
+        profiler.mark("collision")
+
+
+    def step(self, action=0):
+        # action is one of LEFT/RIGHT/UP/DOWN, or 0 to keep the buffered direction
+        if action:
+            self.pacman.next_direction = action
+        score_before = self.score
+        self.pacman.update_animation(TICK_MS)
+        self.update()
+        reward = self.score - score_before
+        info = {"score": self.score, "lives": self.lives, "tick": self.tick_count, "level_complete": self.level_complete}
+        return self.observe(), reward, self.done, info
+
+
+    def state_digest(self):
+        # fingerprint of everything a replay has to reproduce exactly
+        digest = hashlib.sha1(self.game_map.tobytes())
+        actors = [(self.pacman.x, self.pacman.y, self.pacman.direction)] + [(ghost.x, ghost.y, ghost.direction) for ghost in self.ghosts]
+        digest.update(repr((self.tick_count, self.score, self.lives, actors)).encode())
+        return digest.hexdigest()
+
+
+    def observe(self):
+        rows, cols = self.maze.rows, self.maze.cols
+        obs = np.zeros((self.OBSERVATION_CHANNELS, rows, cols), dtype=np.uint8)
+        obs[0] = self.maze.walls
+        obs[1] = self.game_map == PELLET
+        map_x, map_y = self.pacman.get_map_x(), self.pacman.get_map_y()
+        if 0 <= map_x < cols and 0 <= map_y < rows:
+            obs[2, map_y, map_x] = 1
+        for ghost in self.ghosts:
+            map_x, map_y = ghost.get_map_x(), ghost.get_map_y()
+            if 0 <= map_x < cols and 0 <= map_y < rows:
+                obs[3, map_y, map_x] += 1
+        return obs
+
+
+
+class VectorPacmanEnv:
+    def __init__(self, count, **env_kwargs):
+        self.envs = [PacmanEnv(**env_kwargs) for _ in range(count)]
+
+
+    def reset(self):
+        return np.stack([env.reset() for env in self.envs])
+
+
+    def step(self, actions):
+        # finished games are reset in place, so the returned observation is already the first of the next episode
+        observations = []
+        rewards = np.zeros(len(self.envs), dtype=np.float32)
+        dones = np.zeros(len(self.envs), dtype=bool)
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            obs, rewards[i], dones[i], _ = env.step(action)
+            if dones[i]:
+                obs = env.reset()
+            observations.append(obs)
+        return np.stack(observations), rewards, dones
+
+
+
+class Match:
+    # one multiplayer game: several Pacmen share the maze, the pellets and the ghosts. Everything
+    # lives on the instance, so a server can step hundreds of these side by side
+    def __init__(self, maze, match_id, players=4, lives=3, ghost_count=ghost_count):
+        self.maze = maze
+        self.match_id = match_id
+        self.game_map = maze.tiles.copy()
+        self.pellets_remaining = maze.pellet_count
+        self.tick_count = 0
+        self.done = False
+        self.planner = GhostPlanner(maze)
+        self.pacmen = [create_new_pacman(maze) for _ in range(players)]
+        self.chase_fields = [FlowField(maze) for _ in range(players)]
+        self.scores = [0] * players
+        self.lives = [lives] * players
+        self.ghosts = create_ghosts(maze, ghost_count)
+        self.inputs = {}
+        self.eaten_tiles = []
+        self.targets = []
+
+
+    def alive(self, slot):
+        return self.lives[slot] > 0
+
+
+    def eliminate(self, slot):
+        self.lives[slot] = 0
+        if not any(self.lives):
+            self.done = True
+
+
+    def chase_field_for(self, ghost):
+        # a ghost chases the nearest Pacman within its range
+        ghost_x, ghost_y = ghost.get_map_x(), ghost.get_map_y()
+        best_distance = ghost.range_radius * ghost.range_radius + 1
+        best = None
+        for field, (x, y) in self.targets:
+            distance = (ghost_x - x) * (ghost_x - x) + (ghost_y - y) * (ghost_y - y)
+            if distance < best_distance:
+                best_distance = distance
+                best = field
+        return best
+
+
+    def update(self):
+        self.tick_count += 1
+        for slot, pacman in enumerate(self.pacmen):
+            if not self.alive(slot):
+                continue
+            turn = self.inputs.pop(slot, 0)
+            pacman.move_process(self.maze, ((0.0, turn),) if turn else ())
+            eaten_tile = pacman.eat(self.game_map)
+            if eaten_tile:
+                self.scores[slot] += 1
+                self.pellets_remaining -= 1
+                self.eaten_tiles.append(eaten_tile)
+        if self.pellets_remaining == 0:
+            self.done = True
+            return
+        self.targets = []
+        for slot, pacman in enumerate(self.pacmen):
+            if self.alive(slot):
+                field = self.chase_fields[slot]
+                field.update(pacman.get_map_x(), pacman.get_map_y())
+                self.targets.append((field, field.target))
+        self.planner.collect()
+        for ghost in self.ghosts:
+            ghost.move_process(self)
+        ghost_tiles = {(ghost.get_map_x(), ghost.get_map_y()) for ghost in self.ghosts}
+        for slot, pacman in enumerate(self.pacmen):
+            if self.alive(slot) and (pacman.get_map_x(), pacman.get_map_y()) in ghost_tiles:
+                # only the caught Pacman goes back to the start; the others play on
+                self.lives[slot] -= 1
+                self.pacmen[slot] = create_new_pacman(self.maze)
+        if not any(self.lives):
+            self.done = True
+
+
+
+class MatchSession:
+    # the network side of a Match: its clients and the state they were last sent. Every tick
+    # all clients get the same delta, holding only the actors that moved, the pellets eaten
+    # and the players whose score or lives changed, so it is encoded once per match
+    def __init__(self, match):
+        self.match = match
+        self.writers = [None] * len(match.pacmen)
+        self.sent_actors = None
+        self.sent_players = None
+
+
+    def full(self):
+        return all(writer is not None for writer in self.writers)
+
+
+    def actor_states(self):
+        return [(actor.x, actor.y, actor.direction) for actor in self.match.pacmen + self.match.ghosts]
+
+
+    def player_states(self):
+        return list(zip(self.match.scores, self.match.lives))
+
+
+    def snapshot(self, slot):
+        match = self.match
+        rows, cols = match.game_map.shape
+        parts = [SNAPSHOT_HEADER.pack(MSG_SNAPSHOT, match.match_id, slot, len(match.pacmen), cols, rows, len(match.ghosts)), match.game_map.tobytes()]
+        parts += [ACTOR_RECORD.pack(i, *state) for i, state in enumerate(self.sent_actors)]
+        parts += [PLAYER_RECORD.pack(i, *state) for i, state in enumerate(self.sent_players)]
+        return b"".join(parts)
+
+
+    def start(self):
+        self.sent_actors = self.actor_states()
+        self.sent_players = self.player_states()
+        for slot in range(len(self.writers)):
+            self.send(slot, self.snapshot(slot))
+
+
+    def delta(self):
+        actors = self.actor_states()
+        players = self.player_states()
+        moved = [ACTOR_RECORD.pack(i, *state) for i, (state, sent) in enumerate(zip(actors, self.sent_actors)) if state != sent]
+        changed = [PLAYER_RECORD.pack(i, *state) for i, (state, sent) in enumerate(zip(players, self.sent_players)) if state != sent]
+        eaten = [PELLET_RECORD.pack(x, y) for x, y in self.match.eaten_tiles]
+        self.match.eaten_tiles.clear()
+        self.sent_actors = actors
+        self.sent_players = players
+        return b"".join([DELTA_HEADER.pack(MSG_DELTA, self.match.tick_count, len(moved), len(eaten), len(changed))] + moved + eaten + changed)
+
+
+    def send(self, slot, payload):
+        writer = self.writers[slot]
+        if writer is None:
+            return 0
+        if writer.transport.get_write_buffer_size() > SEND_BUFFER_LIMIT:
+            # a client that stops reading is dropped rather than buffered without bound
+            self.leave(slot)
+            return 0
+        writer.write(FRAME_LENGTH.pack(len(payload)) + payload)
+        return len(payload) + FRAME_LENGTH.size
+
+
+    def broadcast(self, payload):
+        return sum(self.send(slot, payload) for slot in range(len(self.writers)))
+
+
+    def leave(self, slot):
+        writer = self.writers[slot]
+        if writer is None:
+            return
+        self.writers[slot] = None
+        self.match.eliminate(slot)
+        writer.close()
+
+
+    def close(self):
+        for slot in range(len(self.writers)):
+            self.leave(slot)
+
+
+
+class MatchServer:
+    # one asyncio loop runs every match on the same fixed tick; the simulation is plain
+    # synchronous code, so the only awaits are socket I/O and the sleep to the next tick
+    def __init__(self, maze, players, ghost_pairs):
+        self.maze = maze
+        self.players = players
+        self.ghost_pairs = ghost_pairs
+        self.running = []
+        self.waiting = None
+        self.match_count = 0
+        self.tick_count = 0
+        self.handlers = set()
+        self.closing = False
+
+
+    def join(self, writer):
+        if self.waiting is None:
+            self.match_count += 1
+            self.waiting = MatchSession(Match(self.maze, self.match_count, self.players, ghost_count=self.ghost_pairs))
+        session = self.waiting
+        slot = session.writers.index(None)
+        session.writers[slot] = writer
+        if session.full():
+            session.start()
+            self.running.append(session)
+            self.waiting = None
+        return session, slot
+
+
+    async def handle_client(self, reader, writer):
+        if self.closing:
+            writer.close()
+            return
+        self.handlers.add(asyncio.current_task())
+        session, slot = self.join(writer)
+        try:
+            while True:
+                kind, direction = INPUT_MESSAGE.unpack(await reader.readexactly(INPUT_MESSAGE.size))
+                if kind == MSG_INPUT and direction in OPPOSITE:
+                    # the last input before a tick wins, and it is applied at the start of that tick
+                    session.match.inputs[slot] = direction
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is self.waiting:
+                session.writers[slot] = None
+                writer.close()
+            else:
+                session.leave(slot)
+            self.handlers.discard(asyncio.current_task())
+
+
+    def tick(self):
+        sent = 0
+        for session in self.running:
+            match = session.match
+            if not match.done:
+                match.update()
+            sent += session.broadcast(session.delta())
+            if match.done:
+                sent += session.broadcast(END_HEADER.pack(MSG_END, match.tick_count))
+                session.close()
+        self.running = [session for session in self.running if not session.match.done]
+        self.tick_count += 1
+        return sent
+
+
+    async def serve(self, port, max_ticks=0, bots=0):
+        server = await asyncio.start_server(self.handle_client, "127.0.0.1", port, backlog=max(SERVER_BACKLOG, bots))
+        bot_tasks = [asyncio.create_task(run_bot("127.0.0.1", port, i)) for i in range(bots)]
+        print(f"serving {self.players}-player matches on 127.0.0.1:{port}")
+        loop = asyncio.get_running_loop()
+        tick_seconds = TICK_MS / 1000
+        next_tick = loop.time()
+        work = worst = 0.0
+        sent = 0
+        while max_ticks <= 0 or self.tick_count < max_ticks:
+            started = time.perf_counter()
+            sent += self.tick()
+            elapsed = time.perf_counter() - started
+            work += elapsed
+            worst = max(worst, elapsed)
+            if self.tick_count % SERVER_REPORT_TICKS == 0:
+                players = sum(1 for session in self.running for writer in session.writers if writer is not None)
+                print(f"tick {self.tick_count}: {len(self.running)} matches, {players} players, "
+                      f"{work * 1000 / SERVER_REPORT_TICKS:.2f} ms/tick (worst {worst * 1000:.2f} ms), "
+                      f"{sent / SERVER_REPORT_TICKS / 1024:.1f} KiB/tick sent")
+                work = worst = 0.0
+                sent = 0
+            next_tick += tick_seconds
+            now = loop.time()
+            if now - next_tick > MAX_FRAME_MS / 1000:
+                # too far behind to catch up; drop the missed ticks instead of running them back to back
+                next_tick = now
+            await asyncio.sleep(max(0.0, next_tick - now))
+        self.closing = True
+        server.close()
+        for task in bot_tasks:
+            task.cancel()
+        for session in self.running + ([self.waiting] if self.waiting else []):
+            session.close()
+        # closing a client's socket ends its handler at the next read, so they all finish on their own
+        await asyncio.gather(*bot_tasks, *self.handlers, return_exceptions=True)
+        await server.wait_closed()
+
+
+
+class NullProfiler:
+    visible = False
+
+    def start(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+
+
+NULL_PROFILER = NullProfiler()
+
+
+
+class FrameProfiler:
+    # per-frame phase timings: mark(phase) books the time since the previous mark, a rolling window
+    # feeds the F3 overlay and every finished frame can be written to a CSV file
+    def __init__(self, history=240, csv_path=None):
+        self.history = deque(maxlen=history)
+        self.times = dict.fromkeys(PROFILE_PHASES, 0.0)
+        self.last_mark = time.perf_counter()
+        self.last_frame_end = None
+        self.frame = 0
+        self.ticks = 0
+        self.visible = False
+        self.panel = None
+        self.font = None
+        self.csv_file = None
+        if csv_path:
+            self.csv_file = open(csv_path, "w", newline="", encoding="utf-8")
+            self.writer = csv.writer(self.csv_file)
+            self.writer.writerow(["frame", "ticks"] + [f"{phase}_ms" for phase in PROFILE_PHASES] + ["work_ms", "interval_ms"])
+
+
+    def start(self):
+        self.last_mark = time.perf_counter()
+
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.times[phase] += (now - self.last_mark) * 1000
+        self.last_mark = now
+
+
+    def end_frame(self):
+        now = time.perf_counter()
+        interval = 0.0 if self.last_frame_end is None else (now - self.last_frame_end) * 1000
+        self.last_frame_end = now
+        self.history.append(dict(self.times))
+        if self.csv_file:
+            work = sum(self.times.values())
+            self.writer.writerow([self.frame, self.ticks] + [f"{self.times[phase]:.3f}" for phase in PROFILE_PHASES] + [f"{work:.3f}", f"{interval:.3f}"])
+        self.frame += 1
+        self.ticks = 0
+        self.times = dict.fromkeys(PROFILE_PHASES, 0.0)
+        if self.frame % OVERLAY_REFRESH_FRAMES == 0:
+            self.panel = None
+
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.panel = None
+
+
+    def series(self, name):
+        phases = PROFILE_GROUPS.get(name, PROFILE_PHASES if name == "frame" else [name])
+        return [sum(frame[phase] for phase in phases) for frame in self.history]
+
+
+    def overlay(self):
+        # rebuilt a few times a second; in between the same panel is blitted again
+        if self.panel is not None:
+            return self.panel
+        if self.font is None:
+            self.font = pygame.font.SysFont("Arial", 12)
+        rows = ["events", "pacman", "ghosts", "collision", "update", "background", "sprites", "hud", "flip", "draw", "frame"]
+        bin_width = 8
+        hist_x = 190
+        panel = pygame.Surface((hist_x + bin_width * (len(PROFILE_BIN_EDGES) + 1) + 6, 14 * (len(rows) + 1) + 6))
+        panel.fill((20, 20, 20))
+        panel.blit(self.font.render("mean / p95", True, TEXT_COLOR), (80, 3))
+        panel.blit(self.font.render(f"10us .. {FRAME_BUDGET_MS:.0f}ms+", True, TEXT_COLOR), (hist_x, 3))
+        for i, name in enumerate(rows, 1):
+            y = 3 + 14 * i
+            values = sorted(self.series(name)) or [0.0]
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            mean = sum(values) / len(values)
+            color = (255, 90, 90) if p95 > FRAME_BUDGET_MS else TEXT_COLOR
+            indent = 4 if name in PROFILE_GROUPS or name in ("events", "frame") else 14
+            panel.blit(self.font.render(name, True, color), (indent, y))
+            panel.blit(self.font.render(f"{mean:6.2f} / {p95:6.2f} ms", True, color), (80, y))
+            counts = [0] * (len(PROFILE_BIN_EDGES) + 1)
+            for value in values:
+                counts[next((b for b, edge in enumerate(PROFILE_BIN_EDGES) if value < edge), len(PROFILE_BIN_EDGES))] += 1
+            for b, count in enumerate(counts):
+                if count:
+                    height = max(1, 12 * count // len(values))
+                    bar_color = (255, 60, 60) if b == len(PROFILE_BIN_EDGES) else (90, 200, 90)
+                    panel.fill(bar_color, (hist_x + b * bin_width, y + 12 - height, bin_width - 1, height))
+        self.panel = panel
+        return panel
 
 
+    def close(self):
+        if self.csv_file:
+            self.csv_file.close()
+            self.csv_file = None
 
 
-while running:
+
+KEY_DIRECTIONS = {
+    pygame.K_LEFT: LEFT, pygame.K_a: LEFT,
+    pygame.K_RIGHT: RIGHT, pygame.K_d: RIGHT,
+    pygame.K_UP: UP, pygame.K_w: UP,
+    pygame.K_DOWN: DOWN, pygame.K_s: DOWN,
+}
+
+
+
+class InputBuffer:
+    def __init__(self):
+        self.presses = deque()
+
+
+    def push(self, key, timestamp):
+        if key in KEY_DIRECTIONS:
+            self.presses.append((timestamp, KEY_DIRECTIONS[key]))
+
+
+    def take(self, tick_start, tick_end):
+        # presses up to tick_end, as (fraction of the tick, direction); late-processed ones count from the start
+        turns = []
+        while self.presses and self.presses[0][0] < tick_end:
+            timestamp, direction = self.presses.popleft()
+            turns.append((max(0.0, (timestamp - tick_start) / (tick_end - tick_start)), direction))
+        return turns
+
+
+
+class Recorder:
+    # a header line with everything needed to rebuild the game, then one "tick direction fraction"
+    # line per input, and an end line with the final tick and state digest
+    def __init__(self, path, maze, planning):
+        self.file = open(path, "w", encoding="utf-8")
+        # the map is named relative to the maps folder, so a recording replays from any checkout
+        header = {"version": 1, "map": map_name(args.map), "generate": args.generate, "seed": args.seed,
+                  "ghost_pairs": args.ghost_pairs, "planning": planning, "maze": maze.key}
+        self.file.write(json.dumps(header) + "\n")
 
 
+    def log(self, tick, turns):
+        for fraction, direction in turns:
+            self.file.write(f"{tick} {direction} {fraction!r}\n")
 
 
+    def close(self, env):
+        self.file.write(f"end {env.tick_count} {env.state_digest()}\n")
+        self.file.close()
 
-    dt = clock.tick(FPS)
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-            pygame.quit()
-            sys.exit()
-        elif event.type == pygame.KEYDOWN:
-            if event.key in [pygame.K_LEFT, pygame.K_a]:
-                pacman_obj.next_direction = LEFT
-            elif event.key in [pygame.K_RIGHT, pygame.K_d]:
-                pacman_obj.next_direction = RIGHT
-            elif event.key in [pygame.K_UP, pygame.K_w]:
-                pacman_obj.next_direction = UP
-            elif event.key in [pygame.K_DOWN, pygame.K_s]:
-                pacman_obj.next_direction = DOWN
 
 
+class Replay:
+    def __init__(self, path):
+        self.events = {}
+        self.end_tick = None
+        self.digest = None
+        with open(path, encoding="utf-8") as f:
+            self.header = json.loads(f.readline())
+            for line in f:
+                fields = line.split()
+                if fields[0] == "end":
+                    self.end_tick = int(fields[1])
+                    self.digest = fields[2]
+                else:
+                    self.events.setdefault(int(fields[0]), []).append((float(fields[2]), int(fields[1])))
 
-    pacman_obj.update_animation(dt)
-    update_game(pacman_obj, ghosts_obj, game_map)
-    draw_game(pacman_obj, ghosts_obj, game_map)
+
+    def apply_settings(self):
+        args.map = os.path.join(MAPS_DIR, os.path.normpath(self.header["map"]))
+        args.generate = self.header["generate"]
+        args.seed = self.header["seed"]
+        args.ghost_pairs = self.header["ghost_pairs"]
+        args.planning = self.header["planning"]
+
+
+    def turns(self, tick):
+        return self.events.get(tick, ())
+
+
+
+def now_ms():
+    return time.perf_counter() * 1000
+
+
+
+def end_of_game_message(env):
+    if env.level_complete:
+        return f"Level Complete! Final Score: {env.score}"
+    return f"Game Over! Final Score: {env.score}"
+
+
+
+def draw_game(env, alpha=1.0):
+    renderer.profiler.start()
+    for map_x, map_y in env.eaten_tiles:
+        renderer.clear_pellet(map_x, map_y)
+    env.eaten_tiles.clear()
+    renderer.draw(env, alpha)
+
+
+
+
+def run_replay(env, replay, draw=None, profiler=None):
+    # replays run uncapped: every recorded tick back to back, drawn after each one when a window is open
+    started = time.perf_counter()
+    while not env.done and (replay.end_tick is None or env.tick_count < replay.end_tick):
+        env.pacman.update_animation(TICK_MS)
+        env.update(replay.turns(env.tick_count))
+        if draw:
+            profiler.start()
+            for event in pygame.event.get():
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    profiler.toggle()
+            profiler.mark("events")
+            draw(env)
+        else:
+            env.eaten_tiles.clear()
+        if profiler:
+            profiler.ticks += 1
+            profiler.end_frame()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"{env.tick_count} ticks in {elapsed:.2f}s ({env.tick_count / elapsed:.0f} ticks/s), score {env.score}")
+    if replay.digest is None:
+        print("recording has no end line, nothing to compare against")
+    elif env.state_digest() == replay.digest:
+        print("replay matches the recording")
+    else:
+        print("replay diverged from the recording")
+
+
+def run_headless(maze, max_ticks, seed, env_count, planning, recorder=None, profiler=None):
+    rng = random.Random(seed)
+    actions = [0, LEFT, RIGHT, UP, DOWN]
+    if env_count > 1:
+        envs = VectorPacmanEnv(env_count, maze=maze, ghost_count=args.ghost_pairs, planning=planning)
+        started = time.perf_counter()
+        ticks = 0
+        while max_ticks <= 0 or ticks < max_ticks:
+            envs.step([actions[rng.randrange(5)] if rng.random() < 0.1 else 0 for _ in range(env_count)])
+            ticks += 1
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        print(f"{ticks} ticks x {env_count} games in {elapsed:.2f}s ({ticks * env_count / elapsed:.0f} env steps/s)")
+        return
+    env = PacmanEnv(maze, ghost_count=args.ghost_pairs, planning=planning)
+    if profiler:
+        env.profiler = profiler
+    started = time.perf_counter()
+    while not env.done and (max_ticks <= 0 or env.tick_count < max_ticks):
+        action = rng.choice(actions[1:]) if rng.random() < 0.1 else 0
+        if recorder and action:
+            recorder.log(env.tick_count, [(0.0, action)])
+        env.step(action)
+        env.eaten_tiles.clear()
+        if profiler:
+            profiler.ticks += 1
+            profiler.end_frame()
+    if recorder:
+        recorder.close(env)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    if env.done:
+        print(end_of_game_message(env))
+    print(f"{env.tick_count} ticks in {elapsed:.2f}s ({env.tick_count / elapsed:.0f} ticks/s), score {env.score}")
+
+
+
+class MatchView:
+    # a client's copy of one match: built from the snapshot, then kept current by the deltas
+    def __init__(self):
+        self.match_id = None
+        self.slot = None
+        self.tick_count = 0
+        self.game_map = None
+        self.actors = []
+        self.players = []
+
+
+    def apply(self, payload):
+        kind = payload[0]
+        if kind == MSG_SNAPSHOT:
+            _, self.match_id, self.slot, players, cols, rows, ghosts = SNAPSHOT_HEADER.unpack_from(payload)
+            offset = SNAPSHOT_HEADER.size
+            self.game_map = np.frombuffer(payload, dtype=np.uint8, count=rows * cols, offset=offset).reshape(rows, cols).copy()
+            offset += rows * cols
+            self.actors = [ACTOR_RECORD.unpack_from(payload, offset + i * ACTOR_RECORD.size)[1:] for i in range(players + ghosts)]
+            offset += (players + ghosts) * ACTOR_RECORD.size
+            self.players = [PLAYER_RECORD.unpack_from(payload, offset + i * PLAYER_RECORD.size)[1:] for i in range(players)]
+        elif kind == MSG_DELTA:
+            _, self.tick_count, moved, eaten, changed = DELTA_HEADER.unpack_from(payload)
+            offset = DELTA_HEADER.size
+            for _ in range(moved):
+                actor, x, y, direction = ACTOR_RECORD.unpack_from(payload, offset)
+                self.actors[actor] = (x, y, direction)
+                offset += ACTOR_RECORD.size
+            for _ in range(eaten):
+                x, y = PELLET_RECORD.unpack_from(payload, offset)
+                self.game_map[y, x] = EATEN
+                offset += PELLET_RECORD.size
+            for _ in range(changed):
+                slot, score, lives = PLAYER_RECORD.unpack_from(payload, offset)
+                self.players[slot] = (score, lives)
+                offset += PLAYER_RECORD.size
+        elif kind == MSG_END:
+            _, self.tick_count = END_HEADER.unpack_from(payload)
+        return kind
+
+
+
+async def run_bot(host, port, seed):
+    # a client that keeps its own copy of the game in a MatchView and plays like the headless
+    # random player; when its match ends it queues for the next one
+    rng = random.Random(seed)
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(TICK_MS / 1000)
+            continue
+        try:
+            # a connection the server never accepted still looks open from this side, so a bot
+            # that hears nothing while it queues for a match reconnects
+            length = await asyncio.wait_for(reader.readexactly(FRAME_LENGTH.size), SNAPSHOT_TIMEOUT_MS / 1000)
+            view = MatchView()
+            while True:
+                kind = view.apply(await reader.readexactly(FRAME_LENGTH.unpack(length)[0]))
+                if kind == MSG_DELTA:
+                    if rng.random() < 0.1:
+                        writer.write(INPUT_MESSAGE.pack(MSG_INPUT, rng.choice([LEFT, RIGHT, UP, DOWN])))
+                elif kind != MSG_SNAPSHOT:
+                    break
+                length = await reader.readexactly(FRAME_LENGTH.size)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+
+async def run_network():
+    if args.serve is not None:
+        await MatchServer(maze_from_args(), args.players, args.ghost_pairs).serve(args.serve, args.ticks, args.bots)
+        return
+    host, port = args.connect.rsplit(":", 1)
+    await asyncio.gather(*(run_bot(host, int(port), i) for i in range(args.bots)))
+
+
+
+def quit_game(env):
+    if recorder:
+        recorder.close(env)
+    profiler.close()
+    shutdown_planner_pool()
+    pygame.quit()
+    sys.exit()
+
+
+
+if args.serve is not None or args.connect:
+    # SDL turns these signals into QUIT events, which nothing reads without a window
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        asyncio.run(run_network())
+    except KeyboardInterrupt:
+        pass
+    sys.exit()
+
+
+
+replay = None
+if args.replay:
+    replay = Replay(args.replay)
+    replay.apply_settings()
+if args.record and args.envs > 1:
+    sys.exit("--record only works with a single game")
+if args.record and not replay and args.seed is None:
+    # the header keeps the seed, so replay can rebuild a generated maze
+    args.seed = random.randrange(1 << 31)
+maze = maze_from_args()
+planning = planning_from_args()
+if replay and replay.header["maze"] != maze.key:
+    sys.exit(f"{args.replay} was recorded on a different maze")
+recorder = Recorder(args.record, maze, planning) if args.record and not replay else None
+profiler = FrameProfiler(csv_path=args.profile_csv)
+if args.headless:
+    # without a window a "frame" is one tick, and only the update phases are filled in
+    headless_profiler = profiler if args.profile_csv else None
+    if replay:
+        env = PacmanEnv(maze, ghost_count=args.ghost_pairs, planning=planning)
+        if headless_profiler:
+            env.profiler = headless_profiler
+        run_replay(env, replay, profiler=headless_profiler)
+    else:
+        run_headless(maze, args.ticks, args.seed, args.envs, planning, recorder, headless_profiler)
+    profiler.close()
+    shutdown_planner_pool()
+    pygame.quit()
+    sys.exit()
+native_size = (maze.cols * block_size, maze.rows * block_size + HUD_HEIGHT)
+if args.fullscreen:
+    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+elif args.window:
+    screen = pygame.display.set_mode(tuple(int(size) for size in args.window.lower().split("x")), pygame.RESIZABLE)
+elif args.scale != 1:
+    screen = pygame.display.set_mode((native_size[0] * args.scale, native_size[1] * args.scale), pygame.RESIZABLE)
+else:
+    screen = pygame.display.set_mode(native_size)
+pygame.display.set_caption("Mario's Pacman")
+env = PacmanEnv(maze, ghost_count=args.ghost_pairs, planning=planning)
+renderer = Renderer(screen, env.game_map, smooth=args.smooth)
+env.profiler = profiler
+renderer.profiler = profiler
+if replay:
+    run_replay(env, replay, draw_game, profiler)
+    quit_game(env)
+input_buffer = InputBuffer()
+frame_ms = 1000 / args.fps
+accumulator = 0.0
+last_time = now_ms()
+next_frame = last_time
+running = True
+
+
+
+
+while running:
+
+
+
+
+    # input is sampled every INPUT_POLL_MS while waiting for the next frame, not once per frame,
+    # and each key press keeps the time it was seen so the simulation can apply it mid-tick
+    while True:
+        profiler.start()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+                quit_game(env)
+            elif event.type == pygame.VIDEOEXPOSE:
+                renderer.full_redraw = True
+            elif event.type == pygame.VIDEORESIZE:
+                renderer.resize(pygame.display.get_surface())
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+            elif event.type == pygame.KEYDOWN:
+                input_buffer.push(event.key, now_ms())
+        profiler.mark("events")
+        now = now_ms()
+        if now >= next_frame:
+            break
+        time.sleep(min(INPUT_POLL_MS, next_frame - now) / 1000)
+    next_frame = max(next_frame + frame_ms, now)
+    dt = now - last_time
+    last_time = now
+
+
+
+    # fixed-timestep simulation: run as many logical ticks as the elapsed time covers, then
+    # draw the actors interpolated between the last two ticks
+    accumulator += min(dt, MAX_FRAME_MS)
+    tick_start = now - accumulator
+    while accumulator >= TICK_MS:
+        accumulator -= TICK_MS
+        env.pacman.update_animation(TICK_MS)
+        turns = input_buffer.take(tick_start, tick_start + TICK_MS)
+        if recorder:
+            recorder.log(env.tick_count, turns)
+        env.update(turns)
+        profiler.ticks += 1
+        tick_start += TICK_MS
+        if env.done:
+            print(end_of_game_message(env))
+            quit_game(env)
+    draw_game(env, accumulator / TICK_MS)
+    profiler.end_frame()
 
 
 
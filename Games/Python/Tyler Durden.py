@@ -2,6 +2,8 @@ import pygame
 import random
 import math
 import os
+import numpy as np
+from collections import OrderedDict
 
 
 
@@ -13,8 +15,334 @@ W = (255, 255, 255)
 D = pygame.display.set_mode((SW, SH))
 C = pygame.time.Clock()
 
-def coll(x1,y1,r1,x2,y2,r2):
-    return math.hypot(x1-x2,y1-y2)<r1+r2
+GS = 64
+QC = 8
+QD = 8
+CL = [(255,0,0),(0,255,0),(255,255,0),(128,0,128),(0,255,255),(255,165,0)]
+AD = os.path.dirname(os.path.abspath(__file__))
+SQ = 0.04
+SB = 64<<20
+
+
+
+
+# every enemy is one row across these arrays: position, radius, speed, heading and its cached
+# unit vector, colour index. Rows are appended into spare capacity and compacted in one pass
+class ES:
+    F=("x","y","r","sp","di","ux","uy","ci")
+    def __init__(s,cap=256):
+        s.n=0
+        for f in s.F:setattr(s,f,np.zeros(cap,np.int8 if f=="ci" else np.float64))
+    def grow(s):
+        for f in s.F:
+            a=getattr(s,f)
+            b=np.zeros(len(a)*2,a.dtype)
+            b[:s.n]=a[:s.n]
+            setattr(s,f,b)
+    def add(s,x,y,r):
+        k=len(x)
+        while s.n+k>len(s.x):s.grow()
+        a=slice(s.n,s.n+k)
+        s.x[a]=x
+        s.y[a]=y
+        s.r[a]=r
+        s.sp[a]=np.random.uniform(1,3,k)
+        s.di[a]=np.random.uniform(0,2*math.pi,k)
+        s.ux[a]=np.cos(s.di[a])
+        s.uy[a]=np.sin(s.di[a])
+        s.ci[a]=np.random.randint(0,len(CL),k)
+        s.n+=k
+    def u(s):
+        n=s.n
+        x,y,r,di,ux,uy=s.x[:n],s.y[:n],s.r[:n],s.di[:n],s.ux[:n],s.uy[:n]
+        x+=s.sp[:n]*ux
+        y+=s.sp[:n]*uy
+        m=(x-r<0)|(x+r>WW)
+        di[m]=math.pi-di[m]
+        ux[m]=-ux[m]
+        m=(y-r<0)|(y+r>WH)
+        di[m]=-di[m]
+        uy[m]=-uy[m]
+    def keep(s,m):
+        n=s.n
+        k=int(m.sum())
+        for f in s.F:
+            a=getattr(s,f)
+            a[:k]=a[:n][m]
+        s.n=k
+        rm=np.full(n,-1,np.int64)
+        rm[m]=np.arange(k)
+        return rm
+
+
+
+
+def spans(lo,hi):
+    c=hi-lo
+    return np.repeat(lo-np.cumsum(c)+c,c)+np.arange(int(c.sum()))
+
+# union-find in array form: every edge hooks the larger of its two roots onto the smaller one,
+# then paths are halved until each tree is flat, until no edge joins two different trees
+def clusters(n,I,J):
+    p=np.arange(n)
+    while len(I):
+        a,b=p[I],p[J]
+        m=a!=b
+        if not m.any():break
+        I,J,a,b=I[m],J[m],a[m],b[m]
+        np.minimum.at(p,np.maximum(a,b),np.minimum(a,b))
+        while True:
+            q=p[p]
+            if (q==p).all():break
+            p=q
+    return p
+
+def cross(sa,ca,sb,cb):
+    t=ca*cb
+    k=np.repeat(np.arange(len(t)),t)
+    o=np.arange(int(t.sum()))-np.repeat(np.cumsum(t)-t,t)
+    return sa[k]+o//cb[k],sb[k]+o%cb[k]
+
+
+
+
+# uniform hash grid for enemies up to GS/2 in radius: two of them can only touch when their
+# centres are in the same or neighbouring cells. Rows are kept sorted by cell key, so a cell,
+# or a run of cells down one column, is a slice; the order carries over from tick to tick and
+# only the few rows that crossed a cell border have to be sorted back in
+class HG:
+    def __init__(s,cs=GS):
+        s.cs=cs
+        s.nx=int(WW//cs)+3
+        s.ny=int(WH//cs)+3
+        s.nb=s.nx*s.ny
+        s.k=np.zeros(0,np.int64)
+        s.o=np.zeros(0,np.int64)
+        s.sk=s.k
+        s.m=0
+    def cell(s,v,n):
+        return np.clip(v//s.cs+1,0,n-1).astype(np.int64)
+    def up(s,x,y,big):
+        k=s.cell(x,s.nx)*s.ny+s.cell(y,s.ny)
+        k[big]=s.nb
+        if len(k)!=len(s.k) or (k!=s.k).any():
+            o=np.concatenate([s.o,np.arange(len(s.k),len(k))])
+            s.o=o[np.argsort(k[o],kind="stable")]
+            s.sk=k[s.o]
+            s.m=int(np.searchsorted(s.sk,s.nb))
+        s.k=k
+    def keep(s,rm):
+        m=rm[s.o]>=0
+        s.o=rm[s.o[m]]
+        s.sk=s.sk[m]
+        s.k=s.k[rm>=0]
+        s.m=int(np.searchsorted(s.sk,s.nb))
+    def q(s,x0,y0,x1,y1):
+        return s.qa(*(np.array([v],np.float64) for v in (x0,y0,x1,y1)))[1]
+    def qa(s,x0,y0,x1,y1):
+        # rows near each of many boxes at once, as (box index, row) pairs: one slice per grid column
+        h=s.cs/2
+        c0,c1=s.cell(x0-h,s.nx),s.cell(x1+h,s.nx)
+        n=c1-c0+1
+        cx=spans(c0,c1+1)
+        sk=s.sk[:s.m]
+        lo=np.searchsorted(sk,cx*s.ny+np.repeat(s.cell(y0-h,s.ny),n))
+        hi=np.searchsorted(sk,cx*s.ny+np.repeat(s.cell(y1+h,s.ny),n),"right")
+        return np.repeat(np.repeat(np.arange(len(x0)),n),hi-lo),s.o[spans(lo,hi)]
+    def pairs(s):
+        u,st,c=np.unique(s.sk[:s.m],return_index=True,return_counts=True)
+        if not len(u):return s.o[:0],s.o[:0]
+        i,j=cross(st,c,st,c)
+        I,J=[i[i<j]],[j[i<j]]
+        for d in (s.ny-1,s.ny,s.ny+1,1):
+            t=np.minimum(np.searchsorted(u,u+d),len(u)-1)
+            h=u[t]==u+d
+            i,j=cross(st[h],c[h],st[t[h]],c[t[h]])
+            I.append(i)
+            J.append(j)
+        return s.o[np.concatenate(I)],s.o[np.concatenate(J)]
+
+
+
+
+def hit(a,b):
+    return a[0]<b[2] and b[0]<a[2] and a[1]<b[3] and b[1]<a[3]
+
+def inside(a,b):
+    return b[0]<=a[0] and b[1]<=a[1] and a[2]<=b[2] and a[3]<=b[3]
+
+
+
+
+# quadtree over bounding boxes for the enemies too big for the grid; merged radii have no upper
+# bound, so these can be any size. An enemy stays in the deepest node that contains its box
+class QN:
+    def __init__(s,b,d):
+        s.b=b
+        s.d=d
+        s.i={}
+        s.ch=None
+    def split(s):
+        x0,y0,x1,y1=s.b
+        mx,my=(x0+x1)/2,(y0+y1)/2
+        s.ch=[QN(b,s.d+1) for b in ((x0,y0,mx,my),(mx,y0,x1,my),(x0,my,mx,y1),(mx,my,x1,y1))]
+
+
+
+
+class QT:
+    def __init__(s,es,b=None):
+        s.es=es
+        s.rt=QN(b or (0,0,WW,WH),0)
+        s.w={}
+        s.bx={}
+    def box(s,i):
+        x,y,r=float(s.es.x[i]),float(s.es.y[i]),float(s.es.r[i])
+        s.bx[i]=(x-r,y-r,x+r,y+r)
+        return s.bx[i]
+    def ins(s,e):
+        bx=s.box(e)
+        n=s.rt
+        while True:
+            if n.ch is None and len(n.i)>=QC and n.d<QD:
+                n.split()
+                old=n.i
+                n.i={}
+                for o in old:
+                    del s.w[o]
+                    s.place(n,o)
+            if n.ch is None:break
+            c=next((c for c in n.ch if inside(bx,c.b)),None)
+            if c is None:break
+            n=c
+        n.i[e]=None
+        s.w[e]=n
+    def place(s,n,e):
+        bx=s.bx[e]
+        c=next((c for c in n.ch if inside(bx,c.b)),None)
+        if c is None:
+            n.i[e]=None
+            s.w[e]=n
+        else:
+            c.i[e]=None
+            s.w[e]=c
+    def rm(s,e):
+        del s.w.pop(e).i[e]
+        del s.bx[e]
+    def mv(s,e):
+        n=s.w[e]
+        bx=s.box(e)
+        if (n is s.rt or inside(bx,n.b)) and (n.ch is None or not any(inside(bx,c.b) for c in n.ch)):return
+        s.rm(e)
+        s.ins(e)
+    def keep(s,rm):
+        w,bx=s.w,s.bx
+        s.w,s.bx={},{}
+        for n in set(w.values()):n.i={}
+        for e,n in w.items():
+            f=int(rm[e])
+            if f>=0:
+                n.i[f]=None
+                s.w[f]=n
+                s.bx[f]=bx[e]
+    def q(s,x0,y0,x1,y1):
+        r=(x0,y0,x1,y1)
+        st=[s.rt]
+        while st:
+            n=st.pop()
+            for e in n.i:
+                if hit(s.bx[e],r):yield e
+            if n.ch:st.extend(c for c in n.ch if hit(c.b,r))
+
+
+
+
+# the broad phase the game talks to: up brings it in step with the enemy rows after they move
+# or spawn, keep follows a compaction, q gives the rows whose box may touch a rectangle and
+# pairs every pair of rows that may touch
+class SI:
+    def __init__(s,es):
+        s.es=es
+        s.g=HG()
+        s.t=QT(es)
+    def up(s):
+        es=s.es
+        n=es.n
+        big=es.r[:n]>s.g.cs/2
+        s.g.up(es.x[:n],es.y[:n],big)
+        for i in np.nonzero(big)[0].tolist():
+            if i in s.t.w:s.t.mv(i)
+            else:s.t.ins(i)
+    def keep(s,rm):
+        s.g.keep(rm)
+        s.t.keep(rm)
+    def q(s,x0,y0,x1,y1):
+        return np.concatenate([s.g.q(x0,y0,x1,y1),np.array(list(s.t.q(x0,y0,x1,y1)),np.int64)])
+    def pairs(s):
+        I,J=s.g.pairs()
+        a=np.array(list(s.t.w),np.int64)
+        es=s.es
+        x,y,r=es.x[a],es.y[a],es.r[a]
+        i,j=s.g.qa(x-r,y-r,x+r,y+r)
+        bb=[(e,b) for e in s.t.w for b in s.t.q(*s.t.bx[e]) if b>e]
+        k,l=np.array(bb,np.int64).reshape(-1,2).T
+        return np.concatenate([I,a[i],k]),np.concatenate([J,j,l])
+
+
+
+
+def box(e):
+    return (e.x-e.r,e.y-e.r,e.x+e.r,e.y+e.r)
+
+
+
+
+# assets are found next to this file wherever it is run from, and each is decoded only once
+class AL:
+    def __init__(s,d=AD):
+        s.d=d
+        s.c={}
+    def img(s,n):
+        if n not in s.c:s.c[n]=pygame.image.load(os.path.join(s.d,n)).convert_alpha()
+        return s.c[n]
+
+
+
+
+A=AL()
+
+
+
+
+# scaled copies of one image on a ladder of sizes SQ apart relative to each other, so a growing
+# sprite reuses each size for a while and is at most about half a step off. Least recently used
+# sizes are evicted once the copies pass SB bytes. Each size is scaled from the smallest level of a
+# halving mipmap chain that is still at least that big, so a big jump in size never resamples the
+# full-resolution original
+class SS:
+    def __init__(s,im,q=SQ,cap=SB):
+        s.m=[im]
+        while max(s.m[-1].get_size())>1:
+            w,h=s.m[-1].get_size()
+            s.m.append(pygame.transform.smoothscale(s.m[-1],(max(1,w//2),max(1,h//2))))
+        s.q=q
+        s.cap=cap
+        s.c=OrderedDict()
+        s.b=0
+    def get(s,r):
+        k=round(math.log(max(r,0.5))/math.log1p(s.q))
+        im=s.c.get(k)
+        if im is None:
+            d=max(1,round(2*(1+s.q)**k))
+            src=next((m for m in reversed(s.m) if min(m.get_size())>=d),s.m[0])
+            im=s.c[k]=pygame.transform.smoothscale(src,(d,d))
+            s.b+=d*d*4
+            # the size just made stays even if it alone is over budget
+            while s.b>s.cap and len(s.c)>1:
+                o=s.c.popitem(last=False)[1]
+                s.b-=o.get_width()*o.get_height()*4
+        else:s.c.move_to_end(k)
+        return im
 
 
 
@@ -37,7 +365,8 @@ class P(B):
     def __init__(s,x,y):
         super().__init__(x,y,20,(0,0,255))
         s.s=5
-        s.org=pygame.image.load("/Users/marioamitrano/Desktop/Baker-FightClub.jpg.webp").convert_alpha()
+        s.org=A.img("Baker-FightClub.jpg.webp")
+        s.ss=SS(s.org)
     def u(s,k):
         dx,dy=0,0
         if k[pygame.K_LEFT] or k[pygame.K_a]:dx=-1
@@ -49,86 +378,74 @@ class P(B):
         s.x=max(s.r,min(WW-s.r,s.x))
         s.y=max(s.r,min(WH-s.r,s.y))
     def d(s,S,cx,cy):
-        xx=int(s.x-cx-s.r)
-        yy=int(s.y-cy-s.r)
-        im=pygame.transform.smoothscale(s.org,(int(s.r*2),int(s.r*2)))
+        im=s.ss.get(s.r)
+        xx=int(s.x-cx-im.get_width()/2)
+        yy=int(s.y-cy-im.get_height()/2)
         S.blit(im,(xx,yy))
 
 
 
-class E(B):
-    def __init__(s,x,y,r):
-        col=random.choice([(255,0,0),(0,255,0),(255,255,0),(128,0,128),(0,255,255),(255,165,0)])
-        super().__init__(x,y,r,col)
-        s.sp=random.uniform(1,3)
-        s.di=random.uniform(0,2*math.pi)
-    def u(s):
-        s.x+=s.sp*math.cos(s.di)
-        s.y+=s.sp*math.sin(s.di)
-        if s.x-s.r<0 or s.x+s.r>WW:s.di=math.pi-s.di
-        if s.y-s.r<0 or s.y+s.r>WH:s.di=-s.di
-
-
-
 class G:
-    def __init__(s):
+    def __init__(s,n=70,ix=SI):
         pygame.display.set_caption("Game")
         s.p=P(WW/2,WH/2)
-        s.e=[]
-        s.n=70
-        for _ in range(s.n):
-            r=random.randint(10,30)
-            x=random.randint(r,WW-r)
-            y=random.randint(r,WH-r)
-            s.e.append(E(x,y,r))
+        s.es=ES()
+        s.ix=ix(s.es)
+        s.n=n
+        r=np.random.randint(10,31,s.n)
+        s.es.add(np.random.randint(r,WW-r+1),np.random.randint(r,WH-r+1),r)
+        s.ix.up()
         s.r=True
         s.f=pygame.font.SysFont(None,24)
         s.sc=0
         s.t=0
-    def sp(s):
-        r=random.randint(10,20)
-        x=random.randint(r,WW-r)
-        y=random.randint(r,WH-r)
-        s.e.append(E(x,y,r))
+    def sp(s,k=1):
+        r=np.random.randint(10,21,k)
+        s.es.add(np.random.randint(r,WW-r+1),np.random.randint(r,WH-r+1),r)
+        s.ix.up()
     def h(s):
         for ev in pygame.event.get():
             if ev.type==pygame.QUIT:s.r=False
     def u(s):
         k=pygame.key.get_pressed()
         s.p.u(k)
-        for en in s.e:en.u()
-        rm=[]
-        for en in s.e:
-            if coll(s.p.x,s.p.y,s.p.r,en.x,en.y,en.r):
-                if s.p.r>en.r:
-                    grow_target = math.sqrt(s.p.r**2 + en.r**2)
-                    diff = grow_target - s.p.r
-                    s.p.r += 0.34 * diff
-                    s.sc+=1
-                    rm.append(en)
-                elif en.r> s.p.r:
-                    s.r=False
-        for en in rm:
-            if en in s.e:
-                s.e.remove(en)
-                s.sp()
-        ec=s.e.copy()
-        for i in range(len(ec)):
-            for j in range(i+1,len(ec)):
-                e1=ec[i]
-                e2=ec[j]
-                if e1 not in s.e or e2 not in s.e:continue
-                if coll(e1.x,e1.y,e1.r,e2.x,e2.y,e2.r):
-                    if e1.r>e2.r:
-                        e1.r=math.sqrt(e1.r**2+e2.r**2)
-                        if e2 in s.e:
-                            s.e.remove(e2)
-                            s.sp()
-                    elif e2.r>e1.r:
-                        e2.r=math.sqrt(e2.r**2+e1.r**2)
-                        if e1 in s.e:
-                            s.e.remove(e1)
-                            s.sp()
+        es=s.es
+        es.u()
+        s.ix.up()
+        dead=np.zeros(es.n,bool)
+        c=np.sort(s.ix.q(*box(s.p)))
+        c=c[np.hypot(es.x[c]-s.p.x,es.y[c]-s.p.y)<s.p.r+es.r[c]]
+        for en,r in zip(c.tolist(),es.r[c].tolist()):
+            if s.p.r>r:
+                grow_target = math.sqrt(s.p.r**2 + r**2)
+                diff = grow_target - s.p.r
+                s.p.r += 0.34 * diff
+                s.sc+=1
+                dead[en]=True
+            elif r> s.p.r:
+                s.r=False
+        # every group of touching enemies merges at once into its biggest member (the lowest row on
+        # a tie), so the outcome does not depend on the order the pairs come in; equal enemies
+        # never absorb each other
+        I,J=s.ix.pairs()
+        r=es.r[:es.n]
+        h=(np.hypot(es.x[I]-es.x[J],es.y[I]-es.y[J])<r[I]+r[J])&(r[I]!=r[J])&~dead[I]&~dead[J]
+        I,J=I[h],J[h]
+        if len(I):
+            v=np.unique(np.concatenate([I,J]))
+            c=clusters(es.n,I,J)[v]
+            top=np.zeros(es.n)
+            np.maximum.at(top,c,r[v])
+            w=np.full(es.n,es.n)
+            np.minimum.at(w,c,np.where(r[v]==top[c],v,es.n))
+            rr=np.sqrt(np.bincount(c,r[v]**2,es.n))
+            dead[v[v!=w[c]]]=True
+            c=np.unique(c)
+            r[w[c]]=rr[c]
+        k=int(dead.sum())
+        if k:
+            s.ix.keep(es.keep(~dead))
+            s.sp(k)
         s.t+=1
         if s.t>=FPS*5:
             s.sp()
@@ -151,7 +468,13 @@ class G:
         D.fill((c,c,c))
         cx,cy=s.cam()
         s.p.d(D,cx,cy)
-        for en in s.e:en.d(D,cx,cy)
+        es=s.es
+        # only enemies whose bounding box reaches into the view are drawn, in row order as before
+        v=np.sort(s.ix.q(cx-1,cy-1,cx+SW+1,cy+SH+1))
+        x,y,r=es.x[v],es.y[v],es.r[v]
+        v=v[(x+r>=cx-1)&(x-r<=cx+SW+1)&(y+r>=cy-1)&(y-r<=cy+SH+1)]
+        for x,y,r,ci in zip((es.x[v]-cx).astype(int).tolist(),(es.y[v]-cy).astype(int).tolist(),es.r[v].astype(int).tolist(),es.ci[v].tolist()):
+            pygame.draw.circle(D,CL[ci],(x,y),r)
         st=s.f.render("Score: "+str(s.sc),True,W)
         D.blit(st,(10,10))
         pygame.display.flip()
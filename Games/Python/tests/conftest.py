@@ -0,0 +1,28 @@
+import os
+import sys
+import types
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+GAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Geometric Pacman.py")
+
+
+@pytest.fixture(scope="session")
+def pacman():
+    # the game runs its main loop at import, so load everything above it
+    with open(GAME) as f:
+        source = f.read()
+    source = source[:source.index("\nreplay = None\n")]
+    module = types.ModuleType("geometric_pacman")
+    module.__file__ = GAME
+    argv = sys.argv
+    sys.argv = [GAME]
+    try:
+        exec(compile(source, GAME, "exec"), module.__dict__)
+    finally:
+        sys.argv = argv
+    yield module
+    module.shutdown_planner_pool()
@@ -0,0 +1,25 @@
+import time
+
+import pytest
+
+
+def tiles_visited(pacman, planning, ticks=600):
+    env = pacman.PacmanEnv(lives=200, planning=planning)
+    seen = [set() for _ in env.ghosts]
+    for _ in range(ticks):
+        env.step(0)
+        for tiles, ghost in zip(seen, env.ghosts):
+            tiles.add((ghost.get_map_x(), ghost.get_map_y()))
+        if planning == "async":
+            # leave the planner thread room to answer, as the frame cap does in a real session
+            time.sleep(0.001)
+    return [len(tiles) for tiles in seen]
+
+
+@pytest.mark.parametrize("planning", ["async", "lockstep"])
+def test_ghosts_leave_the_house(pacman, planning):
+    assert min(tiles_visited(pacman, planning)) > 8
+
+
+def test_lockstep_plays_like_sync(pacman):
+    assert tiles_visited(pacman, "lockstep") == tiles_visited(pacman, "sync")
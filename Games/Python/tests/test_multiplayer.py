@@ -0,0 +1,96 @@
+import asyncio
+import random
+import socket
+
+
+def flat(states):
+    return [value for state in states for value in state]
+
+
+def started_session(pacman, players=2):
+    maze = pacman.load_maze(pacman.DEFAULT_MAP)
+    session = pacman.MatchSession(pacman.Match(maze, 7, players))
+    # with no clients attached, start only records what a snapshot would hold
+    session.start()
+    return session
+
+
+def play(pacman, session, rng):
+    match = session.match
+    for slot in range(len(match.pacmen)):
+        if rng.random() < 0.1:
+            match.inputs[slot] = rng.choice([pacman.LEFT, pacman.RIGHT, pacman.UP, pacman.DOWN])
+    match.update()
+
+
+def test_snapshot_and_deltas_rebuild_the_match(pacman):
+    session = started_session(pacman)
+    match = session.match
+    view = pacman.MatchView()
+    assert view.apply(session.snapshot(1)) == pacman.MSG_SNAPSHOT
+    assert (view.match_id, view.slot) == (7, 1)
+    rng = random.Random(3)
+    for _ in range(300):
+        play(pacman, session, rng)
+        assert view.apply(session.delta()) == pacman.MSG_DELTA
+        assert view.tick_count == match.tick_count
+        assert flat(view.actors) == flat(session.actor_states())
+        assert view.players == session.player_states()
+        assert (view.game_map == match.game_map).all()
+        if match.done:
+            break
+    assert match.scores != [0, 0]
+
+
+def test_delta_holds_exactly_what_changed(pacman):
+    session = started_session(pacman)
+    match = session.match
+    rng = random.Random(5)
+    for _ in range(200):
+        actors = session.actor_states()
+        game_map = match.game_map.copy()
+        play(pacman, session, rng)
+        payload = session.delta()
+        _, tick, moved, eaten, _ = pacman.DELTA_HEADER.unpack_from(payload)
+        offset = pacman.DELTA_HEADER.size
+        moved_ids = set()
+        for _ in range(moved):
+            moved_ids.add(pacman.ACTOR_RECORD.unpack_from(payload, offset)[0])
+            offset += pacman.ACTOR_RECORD.size
+        eaten_tiles = set()
+        for _ in range(eaten):
+            eaten_tiles.add(pacman.PELLET_RECORD.unpack_from(payload, offset))
+            offset += pacman.PELLET_RECORD.size
+        assert tick == match.tick_count
+        assert moved_ids == {i for i, (old, new) in enumerate(zip(actors, session.actor_states())) if old != new}
+        rows, cols = (game_map != match.game_map).nonzero()
+        assert eaten_tiles == set(zip(cols.tolist(), rows.tolist()))
+        if match.done:
+            break
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_server_admits_every_bot(pacman):
+    # more bots than the default listen backlog of 100, all connecting at once
+    bots = 300
+    maze = pacman.load_maze(pacman.DEFAULT_MAP)
+    server = pacman.MatchServer(maze, 4, 4)
+    seen = []
+
+    async def watch():
+        while True:
+            seen.append(sum(1 for session in server.running for writer in session.writers if writer is not None))
+            await asyncio.sleep(0.1)
+
+    async def main():
+        watcher = asyncio.create_task(watch())
+        await server.serve(free_port(), max_ticks=90, bots=bots)
+        watcher.cancel()
+
+    asyncio.run(main())
+    assert max(seen) == bots